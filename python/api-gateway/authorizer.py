@@ -5,28 +5,20 @@ import logging
 from datetime import datetime, UTC
 from jwt import PyJWKClient
 
+from structured_logging import Redacted, get_logger
+
 # Configuration
 JWKS_URL = os.environ.get('JWKS_URL', '')
 JWT_ISSUER = os.environ.get('JWT_ISSUER', '')
 JWT_AUDIENCE = os.environ.get('JWT_AUDIENCE', '')
 
-def get_logger():
-    """Configure a logger compatible with local python interpreter and Lambda."""
-    if len(logging.getLogger().handlers) > 0:
-        # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
-        # `.basicConfig` does not execute. Thus we set the level directly.
-        logging.getLogger().setLevel(logging.INFO)
-    else:
-        logging.basicConfig(level=logging.INFO)
-    return logging.getLogger()
-
-logger = get_logger()
+logger = get_logger("authorizer")
 
 def lambda_handler(event, context):
     """
     AWS Lambda authorizer function for JWT token validation
     """
-    logger.info(f"Authorizer start context: {context}")
+    logger.debug("Authorizer start context: %s", context)
     try:
         # Extract token from Authorization header
         token = event.get('authorizationToken', '')
@@ -49,7 +41,7 @@ def lambda_handler(event, context):
 
         # Generate IAM policy
         policy = generate_policy(principal_id, 'Allow', method_arn, decoded_token)
-        logger.info(f"policy: {policy}")
+        logger.debug("policy: %s", Redacted(policy))
 
         return policy
 
@@ -57,10 +49,10 @@ def lambda_handler(event, context):
         logger.exception("Token has expired")
         raise Exception('Unauthorized: Token expired')
     except jwt.InvalidTokenError as e:
-        logger.exception(f"Invalid token: {str(e)}")
+        logger.exception("Invalid token: %s", e)
         raise Exception('Unauthorized: Invalid token')
     except Exception as e:
-        logger.exception(f"Authorization error: {str(e)}")
+        logger.exception("Authorization error: %s", e)
         raise Exception('Unauthorized')
 
 
@@ -70,20 +62,19 @@ def validate_jwt(token):
     """
     if JWKS_URL:
         # Use JWKS for validation (recommended for production)
-        logger.info(f"Use JWKS for validation. token: {token}")
-        #"""
-        decoded = jwt.decode(
-            token,
-            options={"verify_signature": False})
-        logger.info(f"decoded token: {decoded}")
-
-        # Convert epoch to a datetime object
-        exp_datetime = datetime.fromtimestamp(decoded['exp'], tz=UTC)
-        # Format as a readable string (e.g., YYYY-MM-DD HH:MM:SS)
-        readable_exp = exp_datetime.strftime('%Y-%m-%d %H:%M:%S"')
-        utc_time = datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S"')
-        logger.info(f"Token expiration UTC: {readable_exp} UTC time: {utc_time}") 
-        #"""                
+        logger.debug("Use JWKS for validation")
+        # Decoding the unverified token only to log its expiry is skipped unless debug logging is enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            decoded = jwt.decode(
+                token,
+                options={"verify_signature": False})
+
+            # Convert epoch to a datetime object
+            exp_datetime = datetime.fromtimestamp(decoded['exp'], tz=UTC)
+            # Format as a readable string (e.g., YYYY-MM-DD HH:MM:SS)
+            readable_exp = exp_datetime.strftime('%Y-%m-%d %H:%M:%S"')
+            utc_time = datetime.now(UTC).strftime('%Y-%m-%d %H:%M:%S"')
+            logger.debug("Token expiration UTC: %s UTC time: %s", readable_exp, utc_time)
         jwks_client = PyJWKClient(JWKS_URL)
         signing_key = jwks_client.get_signing_key_from_jwt(token)
 
@@ -102,7 +93,7 @@ def validate_jwt(token):
             options={"verify_signature": False}
         )
 
-    logger.info(f"decoded token: {decoded}")
+    logger.debug("decoded token: %s", Redacted(decoded))
     return decoded
 
 
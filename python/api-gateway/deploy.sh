@@ -72,6 +72,9 @@ fi
 #    --python-version 3.13 \
 #    --only-binary=:all: --upgrade
 cp authorizer.py package/
+# Logging module shared by the authorizer and the backend, kept with the spring upgrade sources
+cp ../spring_upgrade/structured_logging.py package/
+# The backend function runs the spring upgrade Lambda (lambda_handler.lambda_handler)
 cp ../spring_upgrade/*.py package/
 #  Lambda extracts the package zip to /var/task/. With LD_LIBRARY_PATH=/var/task, when the SSH binary from git-lambda2 runs, it
 #  finds libcrypto.so.10 and libexpat.so.1 there instead of failing. 
@@ -1,17 +1,8 @@
 import json
-import logging
 
-def get_logger():
-    """Configure a logger compatible with local python interpreter and Lambda."""
-    if len(logging.getLogger().handlers) > 0:
-        # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
-        # `.basicConfig` does not execute. Thus we set the level directly.
-        logging.getLogger().setLevel(logging.INFO)
-    else:
-        logging.basicConfig(level=logging.INFO)
-    return logging.getLogger()
+from structured_logging import Redacted, get_logger
 
-logger = get_logger()
+logger = get_logger("example_backend")
 
 def lambda_handler(event, context):
     """
@@ -19,7 +10,7 @@ def lambda_handler(event, context):
     """
     # Get user information from authorizer context
     authorizer_context = event.get('requestContext', {}).get('authorizer', {})
-    logger.info(f"authorizer_context: {authorizer_context}")
+    logger.info("authorizer_context: %s", Redacted(authorizer_context))
 
     user_info = {
         'user_id': authorizer_context.get('user_id', 'unknown'),
@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import json
+import mmap
+import os
+from urllib.parse import urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# content-addressed store for scraped pages
+#
+#   <root>/pages.pack      compressed article bodies, appended back to back
+#   <root>/manifest.jsonl  one line per page: url, key, content_hash, codec, offset, length
+#
+# pages are keyed by the hash of their canonical url, so urls ending the same way no longer overwrite each
+# other. only the <article> body is kept, the docusaurus navigation around it is dropped. identical bodies
+# are stored once and shared by every url pointing at them.
+PACK_FILE = "pages.pack"
+MANIFEST_FILE = "manifest.jsonl"
+
+
+def canonical_url(url):
+    # lowercase scheme and host, drop the fragment and any trailing slash
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def url_key(url):
+    return hashlib.sha256(canonical_url(url).encode("utf-8")).hexdigest()
+
+
+def extract_article(html_str):
+    # keep only the article body, fall back to the whole page if there is none
+    article = BeautifulSoup(html_str, "html.parser").find("article")
+    return str(article) if article else html_str
+
+
+def compress(data):
+    if zstandard:
+        return "zstd", zstandard.ZstdCompressor(level=19).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=9)
+
+
+def decompress(codec, data):
+    if codec == "zstd":
+        if not zstandard:
+            raise RuntimeError("The content store holds zstd pages, install zstandard to read them.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ContentStore:
+    def __init__(self, root="knowledge_base"):
+        self.root = root
+        self.pack_path = os.path.join(root, PACK_FILE)
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        # url key -> manifest entry, and content hash -> (codec, offset, length) of the stored body
+        self.entries = {}
+        self.blobs = {}
+        os.makedirs(root, exist_ok=True)
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a line cut short by an interrupted scrape, the page is simply fetched again
+                    continue
+                self.entries[entry["key"]] = entry
+                self.blobs[entry["content_hash"]] = (entry["codec"], entry["offset"], entry["length"])
+
+    def __contains__(self, url):
+        return url_key(url) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def urls(self):
+        return [entry["url"] for entry in self.entries.values()]
+
+    def save(self, url, html_str):
+        # store the article body of a page, returns its manifest entry
+        body = extract_article(html_str).encode("utf-8")
+        content_hash = hashlib.sha256(body).hexdigest()
+        if content_hash not in self.blobs:
+            codec, data = compress(body)
+            with open(self.pack_path, "ab") as pack:
+                offset = pack.tell()
+                pack.write(data)
+            self.blobs[content_hash] = (codec, offset, len(data))
+
+        codec, offset, length = self.blobs[content_hash]
+        entry = {
+            "url": canonical_url(url),
+            "key": url_key(url),
+            "content_hash": content_hash,
+            "codec": codec,
+            "offset": offset,
+            "length": length,
+        }
+        # the pack is written before the manifest, so every manifest entry points at a complete body
+        with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+            manifest.write(json.dumps(entry) + "\n")
+        self.entries[entry["key"]] = entry
+        return entry
+
+    def read(self, url):
+        entry = self.entries.get(url_key(url))
+        if entry is None:
+            raise KeyError(url)
+        with open(self.pack_path, "rb") as pack:
+            pack.seek(entry["offset"])
+            data = pack.read(entry["length"])
+        return decompress(entry["codec"], data).decode("utf-8")
+
+    def iter_pages(self):
+        # yield (url, article html) for every stored page, reading the pack through a memory map
+        if not self.entries or os.path.getsize(self.pack_path) == 0:
+            return
+        with open(self.pack_path, "rb") as pack, mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for entry in sorted(self.entries.values(), key=lambda entry: entry["offset"]):
+                data = view[entry["offset"]:entry["offset"] + entry["length"]]
+                yield entry["url"], decompress(entry["codec"], data).decode("utf-8")
@@ -3,8 +3,7 @@ import re
 from bs4 import BeautifulSoup, SoupStrainer
 from urllib.parse import urljoin
 import time
-import glob
-import os
+from content_store import ContentStore
 
 
 # fp = urllib.request.urlopen(url)
@@ -21,10 +20,8 @@ import os
 
 # recursively scrape recipes using bfs
 def scrape_recipes(url):
-    # grab list of existing files
-    prev_parsed_files = glob.glob("./knowledge_base/*.html")
-    prev_parsed_file = [os.path.basename(x) for x in prev_parsed_files]
-
+    # pages scraped by a previous run are read back from the store instead of fetched again
+    store = ContentStore("knowledge_base")
 
     next_url = url
     parsed_urls = set()
@@ -40,8 +37,12 @@ def scrape_recipes(url):
             print("Max recipes reached. Exiting.")
             return
         print(f"Parsing {next_url}. {len(parsed_urls)} urls parsed. {len(urls_to_parse)} remaining urls.")
-        html_str = extract_html_str(next_url)
-        save_html(next_url, html_str)
+        cached = next_url in store
+        if cached:
+            html_str = store.read(next_url)
+        else:
+            html_str = extract_html_str(next_url)
+            store.save(next_url, html_str)
         urls = extract_urls_from_html(next_url, html_str)
         
         parsed_urls.add(next_url)
@@ -52,7 +53,8 @@ def scrape_recipes(url):
         next_url = urls_to_parse.pop(0)
         if not next_url: 
             break
-        time.sleep(2)
+        if not cached:
+            time.sleep(2)
 
 
 def extract_html_str(url):
@@ -73,14 +75,6 @@ def extract_html_str(url):
     fp.close()
     return html_str
 
-# save the url from the given html to a file
-def save_html(url, html_str):
-    file_name = url.split("/")[-1]
-    file_path = f"knowledge_base/{file_name}.html"
-    # print(f"Writing to {file_path}.")
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(html_str)
-
 # extract all spring recipe urls from the html article
 def extract_urls_from_html(url, html_str):
     soup = BeautifulSoup(html_str, "html.parser")
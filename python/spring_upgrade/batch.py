@@ -0,0 +1,106 @@
+"""Upgrade several repositories from the command line.
+
+Usage:
+    python batch.py projects.json [--max-workers N] [--report report.json]
+
+`projects.json` holds a list of `/upgrade-project` request bodies, each with `github_url`, `repo_api_url`,
+`spring_version` and `pom_path`. Batches run here rather than behind API Gateway, which cuts requests off after
+29 seconds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from lambda_handler import MODEL_AWS_REGION, PARAMETER_NAMES, PARAMETER_STORE_PREFIX, run_history, upgrade_code
+from model_router import ModelRouter
+from utils import get_config, get_logger
+
+logger = get_logger()
+
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", "4"))
+
+
+def run_batch_project(project, api_key, ssh_private_key, branch_name):
+    """Upgrade a single project of a batch and return its report entry."""
+    repo_url = project["github_url"]
+    start = time.perf_counter()
+    report = {"github_url": repo_url, "spring_version": project["spring_version"], "branch_name": branch_name}
+    try:
+        provider = ModelRouter(model_aws_region=MODEL_AWS_REGION, history=run_history)
+        context = SimpleNamespace(aws_request_id=str(uuid.uuid4()))
+        report["pr_url"] = asyncio.run(upgrade_code(
+            project["spring_version"], provider, api_key, project["repo_api_url"], repo_url, branch_name,
+            ssh_private_key, project["pom_path"], context,
+        ))
+    except Exception as e:
+        logger.exception("Upgrade of %s failed: %s", repo_url, e)
+        report["error"] = f"{type(e).__name__}: {e}"
+    report["duration"] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def run_batch(projects, api_key, ssh_private_key, max_workers=BATCH_MAX_WORKERS):
+    """Upgrade several projects on a bounded thread pool and return a summary report.
+
+    Each project is a dict with the fields of an `/upgrade-project` request. Git mirrors and the Maven repository
+    are cached by the workspace manager and shared between projects, and Bedrock calls are limited globally by
+    `BEDROCK_MAX_CONCURRENCY`.
+    """
+    for project in projects:
+        for field in ("github_url", "repo_api_url", "spring_version", "pom_path"):
+            if field not in project:
+                raise KeyError(field)
+
+    branch_name = f"upgrade-code-{round(time.time())}"
+    start = time.perf_counter()
+    logger.info("Upgrading %s project(s) with %s worker(s)", len(projects), max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda project: run_batch_project(project, api_key, ssh_private_key, branch_name), projects
+        ))
+
+    failed = [result for result in results if "error" in result]
+    return {
+        "branch_name": branch_name,
+        "total": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "duration": round(time.perf_counter() - start, 2),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade several Spring repositories in parallel.")
+    parser.add_argument("projects", help="JSON file with a list of projects to upgrade")
+    parser.add_argument("--max-workers", type=int, default=BATCH_MAX_WORKERS, help="Number of parallel upgrades")
+    parser.add_argument("--report", help="Write the summary report to this file")
+    args = parser.parse_args()
+
+    with open(args.projects, "r") as f:
+        projects = json.load(f)
+
+    config = get_config(PARAMETER_STORE_PREFIX, PARAMETER_NAMES)
+    report = run_batch(projects, config["api_key"], config["ssh_private_key"], args.max_workers)
+    run_history.flush()
+
+    for result in report["results"]:
+        outcome = result.get("pr_url") or result.get("error") or "no changes"
+        logger.info("%s (%ss): %s", result["github_url"], result["duration"], outcome)
+    logger.info(
+        "%s/%s project(s) upgraded, %s failed, in %ss",
+        report["succeeded"], report["total"], report["failed"], report["duration"],
+    )
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
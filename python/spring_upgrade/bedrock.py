@@ -9,18 +9,30 @@ from langchain_core.prompts import PromptTemplate
 # from langchain_community.agent_toolkits import FileManagementToolkits
 import re
 import json
+import os
 import subprocess
 import sys
+import threading
 
+from test_selection import maven_test_command
 from utils import get_logger
 
 config = Config(connect_timeout=240, read_timeout=240)
 
+# Limits concurrent model calls, including those of the test agent, across all threads of the process, e.g. during
+# batch upgrades
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get("BEDROCK_MAX_CONCURRENCY", "4"))
+bedrock_slots = threading.BoundedSemaphore(BEDROCK_MAX_CONCURRENCY)
+
 
 logger = get_logger()
 
+# Maven output is only logged in full at DEBUG, INFO and WARNING records keep its end with the test summary
+MAVEN_LOG_TAIL_CHARS = 1000
+
 DEFAULT_MODEL = "global.anthropic.claude-haiku-4-5-20251001-v1:0"
 DEFAULT_MODEL_REGION = "us-east-1"
+FILE_DELIMITER = "=== "
 PROMPT_TEMPLATE = PromptTemplate(
     input_variables=["version", "source_code"],
     template="""
@@ -28,6 +40,7 @@ Human:
 You are a code upgrading assistant for Spring and Spring boot.
 You will upgrade the provided source code to the given Spring version.
 Generate a modified version of the source code with upgrades. Modify only the code relevant to the upgrade.
+Each file starts with a line "=== <path>". Return each modified file with that same path as its filename.
 
 <verion>
 {version}
@@ -51,6 +64,27 @@ You should also include recommendations on fixing test failures. if there are an
 """,
 )
 
+REPAIR_PROMPT_TEMPLATE = PromptTemplate(
+    input_variables=["version", "errors", "source_code"],
+    template="""
+Human: 
+You are a code upgrading assistant for Spring and Spring boot.
+The provided source code was upgraded to the given Spring version but no longer compiles.
+Fix the compiler errors listed for each file. Return only the files you modified.
+Each file starts with a line "=== <path>". Return each modified file with that same path as its filename.
+
+<version>
+{version}
+</version>
+<errors>
+{errors}
+</errors>
+<code>
+{source_code}
+</code>
+""",
+)
+
 class Model:
     """Model class for GenAI."""
 
@@ -59,14 +93,26 @@ class Model:
         prompt = self._create_prompt(version, source_code_map)
         content = self._invoke(prompt)
         return content
+
+    def repair_code(self, version, source_code_map, errors):
+        """Ask the model to fix the compiler errors reported for the given files."""
+        prompt = self._create_repair_prompt(version, source_code_map, errors)
+        content = self._invoke(prompt)
+        return content
     
-    def test_code(self, code_dir):
+    def test_code(self, code_dir, selection=None):
+        """Run unit tests through the test agent, scoped to a test selection if given."""
         # run_maven_test2(code_dir)
         # file_tools = FileManagementToolkit(root_dir=str(code_dir)).get_tools()
         prompt = self._create_test_prompt(code_dir)
 
-        content = self.test_llm.invoke({"messages": [{"role": "user", "content": prompt}]})
-        print(content)
+        test_llm = self.test_llm
+        if selection is not None:
+            maven_test_tool = create_maven_test_tool(selection)
+            test_llm = create_agent(self.unstructured_llm.bind_tools([maven_test_tool]), [maven_test_tool])
+        content = test_llm.invoke({"messages": [{"role": "user", "content": prompt}]})
+        logger.info("Test agent finished after %s message(s)", len(content["messages"]))
+        logger.debug("Test agent conversation: %s", content)
         return content
 
 class UpdatedCode(BaseModel):
@@ -79,11 +125,23 @@ class CodeUpgradeResponse(BaseModel):
     description: str = Field(description= "A description of the changes")
 
 
+class LimitedChatBedrock(ChatBedrock):
+    """`ChatBedrock` holding one of the `bedrock_slots` for the duration of each model call.
+
+    The tool calls of the test agent run between model calls and do not hold a slot. Only `_generate` is
+    limited, as the models are not streamed.
+    """
+
+    def _generate(self, *args, **kwargs):
+        with bedrock_slots:
+            return super()._generate(*args, **kwargs)
+
+
 class Claude(Model):
     """Claude model class."""
 
     def __init__(self, model_id=DEFAULT_MODEL, model_aws_region=DEFAULT_MODEL_REGION):
-        logger.info(f"Initializing Claude with model_id: {model_id} and region: {model_aws_region}")
+        logger.info("Initializing Claude with model_id: %s and region: %s", model_id, model_aws_region)
         bedrock_client = boto3.client(
             "bedrock-runtime",
             region_name=model_aws_region,
@@ -91,7 +149,7 @@ class Claude(Model):
         )
 
         # Create agent with tools
-        unstructured_llm = ChatBedrock(
+        unstructured_llm = LimitedChatBedrock(
             client=bedrock_client,
             region_name = model_aws_region,
             model_id=model_id,
@@ -106,6 +164,7 @@ class Claude(Model):
             },
         )
 
+        self.unstructured_llm = unstructured_llm
         self.llm = unstructured_llm.with_structured_output(CodeUpgradeResponse)
         test_llm = unstructured_llm.bind_tools([run_maven_test])
         self.test_llm = create_agent(test_llm, [run_maven_test])
@@ -114,16 +173,24 @@ class Claude(Model):
     def _create_prompt(self, version, source_code_map):
         """Create a prompt for the model to generate a code upgrade."""
         logger.info("Creating prompt for model")
-        source_code_parts = []
-        for filename, source_code in source_code_map.items():
-            source_code_parts.append(
-                f"File: {filename}\n\nContents:\n{source_code}\n\n"
-            )
-        concatenated_source_code = "\n".join(source_code_parts)
         prompt = PROMPT_TEMPLATE.format(
-            version=version, source_code=concatenated_source_code
+            version=version, source_code=format_source_code(source_code_map)
         )
         return prompt
+
+    def _create_repair_prompt(self, version, source_code_map, errors):
+        """Create a prompt for the model to fix compiler errors."""
+        logger.info("Creating repair prompt for model")
+        error_parts = []
+        for filename, messages in errors.items():
+            error_parts.append(f"{FILE_DELIMITER}{filename}\n" + "\n".join(messages))
+        prompt = REPAIR_PROMPT_TEMPLATE.format(
+            version=version,
+            errors="\n".join(error_parts),
+            source_code=format_source_code(source_code_map),
+        )
+        return prompt
+
     def _create_test_prompt(self, code_dir):
         """Create a prompt for the model to generate a code upgrade."""
         logger.info("Creating test prompt for model")   
@@ -134,7 +201,7 @@ class Claude(Model):
         """Invoke the model with the prompt."""
         response = self.llm.invoke(prompt)
         # Append opening curly braces which might be missing, depending on the prompt.
-        logger.info(f"Raw response from GenAI: {response}")
+        logger.debug("Raw response from GenAI: %s", response)
         # if not response.startswith("{"):
         #     response = "{" + response
         return response
@@ -142,9 +209,19 @@ class Claude(Model):
     def _invoke_unstructured(self, prompt):
         """Invoke the model with the prompt."""
         response = self.unstructured_llm.invoke(prompt)
-        logger.info(f"Raw response from GenAI: {response}")
+        logger.debug("Raw response from GenAI: %s", response)
         return response
 
+def format_source_code(source_code_map):
+    """Concatenate files into a compact prompt section, each file headed by its repo-relative path.
+
+    Files are sorted by path so the same repo always produces the same prompt.
+    """
+    return "\n".join(
+        f"{FILE_DELIMITER}{filename}\n{source_code}"
+        for filename, source_code in sorted(source_code_map.items())
+    )
+
 def remove_newlines(json_string):
     """Remove newline characters if they aren't enclosed in double quotes."""
     result = json_string
@@ -152,24 +229,35 @@ def remove_newlines(json_string):
     result = re.sub("\\n(?= *})", "", result)
     return result
 
-@tool
-def run_maven_test(code_dir: str) -> str:
-    """Runs a shell command using subprocess and handles potential errors.
+def create_maven_test_tool(selection=None):
+    """Create the maven test tool, scoped to a `MavenTestSelection` if given."""
 
-    Args:
-        code_dir: The code directory to execute unit tests from.
-    """
-    logger.info(f"Running maven tests in directory: {code_dir}")
-    print(f"Running: mvn test -f {code_dir}")
-    command = f'mvn test -f {code_dir}'
-    try:
-        # Capture the output and check the return code
-        result = subprocess.run(command, check=True, shell=True, capture_output=True, text=True)
-        print(result)
-        return result.stdout if result.returncode == 0 else result.stderr
-    except subprocess.CalledProcessError as e:
-        print(f"Command '{command}' failed with return code {e.returncode}")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        return e.stderr
-    
\ No newline at end of file
+    @tool
+    def run_maven_test(code_dir: str) -> str:
+        """Runs a shell command using subprocess and handles potential errors.
+
+        Args:
+            code_dir: The code directory to execute unit tests from.
+        """
+        logger.info("Running maven tests in directory: %s", code_dir)
+        command = maven_test_command(code_dir, selection)
+        logger.info("Running: %s", command)
+        try:
+            # Capture the output and check the return code
+            result = subprocess.run(command, check=True, shell=True, capture_output=True, text=True)
+            logger.info(
+                "Maven tests finished with return code %s:\n%s", result.returncode, result.stdout[-MAVEN_LOG_TAIL_CHARS:]
+            )
+            logger.debug("Maven output: %s", result.stdout)
+            return result.stdout if result.returncode == 0 else result.stderr
+        except subprocess.CalledProcessError as e:
+            logger.warning(
+                "Command '%s' failed with return code %s:\n%s", command, e.returncode, e.stdout[-MAVEN_LOG_TAIL_CHARS:]
+            )
+            logger.debug("Maven output: %s\nMaven errors: %s", e.stdout, e.stderr)
+            return e.stderr
+
+    return run_maven_test
+
+
+run_maven_test = create_maven_test_tool()
@@ -0,0 +1,248 @@
+"""Offline end-to-end benchmark of the upgrade pipeline.
+
+Bedrock is replaced by recorded model responses, GitHub by a fake provider and SSM by fixed config. The
+bundled sample projects are turned into local git repos with a bare `origin`, so cloning and pushing run for
+real. Each run reports the duration of every pipeline stage. With `--memory`, one more run per fixture is traced
+with `tracemalloc` to report the peak memory of each stage, as tracing slows down the timed runs.
+
+The bundled recordings are marked `synthetic`: they were written by hand following the calls the pipeline makes,
+not captured from Bedrock. Re-record them with `--record` to benchmark against real responses.
+
+Usage:
+    python benchmark.py [--fixture webjava8sb2.3] [--repeat 5] [--memory] [--json results.json]
+    python benchmark.py --record --fixture webjava8sb2.3   # record live Bedrock responses for a fixture
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from types import SimpleNamespace
+
+import lambda_handler
+from bedrock import CodeUpgradeResponse
+from history import RunHistory
+from model_router import ModelRouter, merge_responses
+from utils import get_logger
+from workspace import WorkspaceManager
+
+logger = get_logger()
+
+PROJECTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "benchmark_recordings")
+FIXTURES = ["webjava8sb2.3", "consolejava8sb2.3"]
+
+
+def recording_path(fixture):
+    return os.path.join(RECORDINGS_DIR, f"{fixture}.json")
+
+
+def load_recording(fixture):
+    with open(recording_path(fixture), "r") as f:
+        return json.load(f)
+
+
+def create_fixture_repo(fixture, root):
+    """Copy a bundled project into a git repo with a bare `origin` remote. Returns the remote URL."""
+    work_dir = os.path.join(root, "source")
+    remote_dir = os.path.join(root, "remote", fixture)
+    shutil.copytree(os.path.join(PROJECTS_DIR, fixture), work_dir)
+    git = ["git", "-c", "user.name=benchmark", "-c", "user.email=benchmark@example.com"]
+    subprocess.run(["git", "init", "--bare", "-q", "-b", "main", remote_dir], check=True)
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=work_dir, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=work_dir, check=True)
+    subprocess.run([*git, "commit", "-q", "-m", "Initial commit"], cwd=work_dir, check=True)
+    subprocess.run(["git", "push", "-q", remote_dir, "main"], cwd=work_dir, check=True)
+    return remote_dir
+
+
+class ReplayModel:
+    """Stand-in for `Claude` returning recorded responses."""
+
+    def __init__(self, recording):
+        self.recording = recording
+
+    def _replay(self, kind, source_code_map):
+        """Return the recorded files of the given kind which belong to the requested batch."""
+        responses = [CodeUpgradeResponse(**response) for response in self.recording[kind]]
+        response = merge_responses(responses)
+        files = [file for file in response.code if file.filename in source_code_map]
+        return response.model_copy(update={"code": files})
+
+    def upgrade_code(self, version, source_code_map):
+        return self._replay("upgrade", source_code_map)
+
+    def repair_code(self, version, source_code_map, errors):
+        return self._replay("repair", source_code_map)
+
+    def test_code(self, code_dir, selection=None):
+        return {"messages": [SimpleNamespace(content=self.recording["test"][-1])]}
+
+
+class RecordingModel:
+    """Wrap a live model and record its responses for later replay."""
+
+    def __init__(self, model, recording):
+        self.model = model
+        self.recording = recording
+
+    def upgrade_code(self, version, source_code_map):
+        response = self.model.upgrade_code(version, source_code_map)
+        self.recording["upgrade"].append(response.model_dump())
+        return response
+
+    def repair_code(self, version, source_code_map, errors):
+        response = self.model.repair_code(version, source_code_map, errors)
+        self.recording["repair"].append(response.model_dump())
+        return response
+
+    def test_code(self, code_dir, selection=None):
+        result = self.model.test_code(code_dir, selection)
+        self.recording["test"].append(result["messages"][-1].content)
+        return result
+
+
+def router_factory(recording, record):
+    """Return a `ModelRouter` replacement whose tiers are backed by replayed or recorded models."""
+
+    class BenchmarkRouter(ModelRouter):
+        def _model(self, tier_index):
+            if record:
+                return RecordingModel(super()._model(tier_index), recording)
+            return ReplayModel(recording)
+
+    return BenchmarkRouter
+
+
+class FakeGitHubProvider:
+    """Stand-in for `GitHubProvider` which records pull requests instead of creating them."""
+
+    pull_requests = []
+
+    def __init__(self, api_key, repo_url):
+        self.repo_url = repo_url
+
+    def create_pull_request(self, branch, title, description):
+        self.pull_requests.append({"branch": branch, "title": title, "description": description})
+        return f"{self.repo_url}/pull/{len(self.pull_requests)}"
+
+
+def fake_get_config(parameter_store_prefix, parameter_names):
+    return {"ssh_private_key": "benchmark-key", "api_key": "benchmark-api-key"}
+
+
+def run_once(fixture, recording, record, root):
+    """Run the pipeline once through `lambda_handler` and return the recorded stages."""
+    remote_url = create_fixture_repo(fixture, os.path.join(root, "fixture"))
+    history = RunHistory(os.path.join(root, "history.jsonl"), s3_uri=None)
+
+    lambda_handler.get_config = fake_get_config
+    lambda_handler.GitHubProvider = FakeGitHubProvider
+    lambda_handler.ModelRouter = router_factory(recording, record)
+    lambda_handler.run_history = history
+    lambda_handler.workspace_manager = WorkspaceManager(root=os.path.join(root, "workspace"), history=history)
+
+    event = {
+        "httpMethod": "POST",
+        "path": "/upgrade-project",
+        "body": json.dumps({
+            "github_url": remote_url,
+            "spring_version": recording["spring_version"],
+            "repo_api_url": "https://api.github.com/repos/benchmark/" + fixture,
+            "pom_path": "pom.xml",
+        }),
+    }
+    start = time.perf_counter()
+    response = lambda_handler.lambda_handler(event, SimpleNamespace(aws_request_id=str(uuid.uuid4())))
+    total = time.perf_counter() - start
+    if response["statusCode"] != 200:
+        raise RuntimeError(f"Pipeline failed for {fixture}: {response['body']}")
+    return {"total": total, "stages": history.load("stage")}
+
+
+def summarize(runs, memory_runs=()):
+    """Aggregate the stage durations of the timed runs and the peak memory of the traced runs."""
+    durations = {}
+    for run in runs:
+        for stage in run["stages"]:
+            durations.setdefault(stage["stage"], []).append(stage["duration"])
+    durations["total"] = [run["total"] for run in runs]
+
+    peaks = {}
+    for run in memory_runs:
+        for stage in run["stages"]:
+            peaks[stage["stage"]] = max(peaks.get(stage["stage"], 0), stage.get("peak_traced_bytes", 0))
+    return {
+        stage: {
+            "mean": statistics.mean(values),
+            "min": min(values),
+            "max": max(values),
+            "peak_traced_bytes": peaks.get(stage),
+        }
+        for stage, values in durations.items()
+    }
+
+
+def run_in_workspace(fixture, recording, record):
+    root = tempfile.mkdtemp(prefix="spring_upgrade_benchmark_")
+    try:
+        return run_once(fixture, recording, record, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the upgrade pipeline against recorded responses.")
+    parser.add_argument("--fixture", action="append", choices=FIXTURES, help="Fixture project(s), default all")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per fixture")
+    parser.add_argument("--record", action="store_true", help="Call Bedrock and record its responses")
+    parser.add_argument("--memory", action="store_true", help="Trace the peak memory of each stage in an extra run")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for fixture in args.fixture or FIXTURES:
+        if args.record:
+            recording = {
+                "synthetic": False, "spring_version": "Spring boot 3.2", "upgrade": [], "repair": [], "test": []
+            }
+            repeat = 1
+        else:
+            recording = load_recording(fixture)
+            repeat = args.repeat
+
+        runs = [run_in_workspace(fixture, recording, args.record) for _ in range(repeat)]
+        memory_runs = []
+        if args.memory and not args.record:
+            tracemalloc.start()
+            try:
+                memory_runs.append(run_in_workspace(fixture, recording, False))
+            finally:
+                tracemalloc.stop()
+
+        if args.record:
+            os.makedirs(RECORDINGS_DIR, exist_ok=True)
+            with open(recording_path(fixture), "w") as f:
+                json.dump(recording, f, indent=2)
+            logger.info("Recorded responses to %s", recording_path(fixture))
+
+        results[fixture] = summarize(runs, memory_runs)
+        source = "synthetic responses" if recording.get("synthetic") else "recorded responses"
+        print(f"\n{fixture} ({len(runs)} run(s), {source})")
+        print(f"{'stage':<10} {'mean s':>8} {'min s':>8} {'max s':>8} {'peak MiB':>9}")
+        for stage, stats in results[fixture].items():
+            peak = "-" if stats["peak_traced_bytes"] is None else f"{stats['peak_traced_bytes'] / 2 ** 20:.2f}"
+            print(f"{stage:<10} {stats['mean']:>8.3f} {stats['min']:>8.3f} {stats['max']:>8.3f} {peak:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
+import hashlib
 import os
+import tempfile
+import threading
 from abc import ABC, abstractmethod
 
 import requests
-from black import FileMode, format_str
 from git import Repo
 
 from utils import get_logger
@@ -10,53 +12,155 @@ from utils import get_logger
 logger = get_logger()
 
 
-def clone_repo(url, repo_dir, ssh_private_key_path):
-    """Clone the target repo to the local file system."""
-    logger.info(f"Cloning repo {url} to {repo_dir}. ssh_private_key_path={ssh_private_key_path}")
-    repo = Repo.clone_from(
-        url,
-        repo_dir,
-        env={
-            "GIT_SSH_COMMAND": f"ssh -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -i {ssh_private_key_path}"
-        },
-    )
+def read_umask():
+    """Return the process umask, which can only be read by setting it."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once at import, as setting the umask to read it would briefly affect files created by other threads
+UMASK = read_umask()
+
+_mirror_locks = {}
+_mirror_locks_lock = threading.Lock()
+
+
+def _mirror_lock(mirror_dir):
+    with _mirror_locks_lock:
+        return _mirror_locks.setdefault(mirror_dir, threading.Lock())
+
+
+def update_mirror(url, mirror_root, env):
+    """Create or refresh a bare mirror of the repo under `mirror_root`, shared by all clones of the URL."""
+    mirror_dir = os.path.join(mirror_root, hashlib.sha1(url.encode()).hexdigest()[:16] + ".git")
+    with _mirror_lock(mirror_dir):
+        if os.path.isdir(mirror_dir):
+            logger.info("Updating mirror %s of %s", mirror_dir, url)
+            Repo(mirror_dir).git.remote("update", "--prune", env=env)
+        else:
+            logger.info("Creating mirror %s of %s", mirror_dir, url)
+            # Only branches and tags are mirrored, GitHub also advertises a refs/pull/* ref for every pull request
+            mirror = Repo.init(mirror_dir, bare=True)
+            mirror.git.config("remote.origin.url", url)
+            mirror.git.config("remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+            mirror.git.config("--add", "remote.origin.fetch", "+refs/tags/*:refs/tags/*")
+            mirror.git.fetch("origin", env=env)
+    return mirror_dir
+
+
+def clone_repo(url, repo_dir, ssh_private_key_path, mirror_root=None):
+    """Clone the target repo to the local file system.
+
+    If `mirror_root` is given, objects are borrowed from a shared local mirror so only new objects are fetched.
+    """
+    logger.info("Cloning repo %s to %s. ssh_private_key_path=%s", url, repo_dir, ssh_private_key_path)
+    env = {
+        "GIT_SSH_COMMAND": f"ssh -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -i {ssh_private_key_path}"
+    }
+    clone_options = {}
+    if mirror_root:
+        clone_options["reference"] = update_mirror(url, mirror_root, env)
+    repo = Repo.clone_from(url, repo_dir, env=env, **clone_options)
     repo.config_writer().set_value("user", "name", "fix-code-bot").release()
     repo.config_writer().set_value("user", "email", "fix@code.bot").release()
     return repo
 
 
-def update_source_code(files, repo_dir, format_code=True):
-    """Overwrite files in target repo."""
-    logger.info(f"Updating source code in {repo_dir}")
+class ChangeSet:
+    """Repo-relative paths created or modified by the upgrade, compared to the cloned repo."""
+
+    def __init__(self):
+        self.created = set()
+        self.modified = set()
+        self.original_hashes = {}
+
+    @property
+    def paths(self):
+        return sorted(self.created | self.modified)
+
+    def __bool__(self):
+        return bool(self.created or self.modified)
+
+    def record(self, path, old_hash, new_hash):
+        """Record a write, dropping the path again if it was restored to its original contents."""
+        original_hash = self.original_hashes.setdefault(path, old_hash)
+        if new_hash == original_hash:
+            self.created.discard(path)
+            self.modified.discard(path)
+        elif original_hash is None:
+            self.created.add(path)
+        else:
+            self.modified.add(path)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_atomic(path, data):
+    """Write a file through a temporary file and a rename, so it is never left half written."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode)
+        else:
+            # mkstemp creates files readable by the owner only, new files get the default mode instead
+            os.chmod(tmp_path, 0o666 & ~UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def update_source_code(files, repo_dir, change_set=None):
+    """Write generated files to the target repo, skipping files whose contents are unchanged.
+
+    Returns the `ChangeSet` of written files, accumulated into `change_set` if given. Write errors are raised.
+    """
+    logger.info("Updating source code in %s", repo_dir)
+    change_set = change_set if change_set is not None else ChangeSet()
     for file in files:
-        if format_code:
-            contents = file.code
-        with open(os.path.join(repo_dir, file.filename), "w") as f:
-            logger.info(f'Writing to {file.filename}')
-            try:
-                f.write(contents)
-            except Exception as e:
-                logger.error(f"Failed writing to {file.filename}: {e}")
-
-
-def format(content):
-    """Format code."""
-    return format_str(content, mode=FileMode())
-
-
-def create_branch(branch_name, repo, commit_message):
-    """Check for any changes to the source code and create a branch."""
-    if repo.index.diff(None):
-        logger.info(
-            f"Source code has been modified, committing changes to branch {branch_name}"
-        )
-        new_branch = repo.create_head(branch_name)
-        new_branch.checkout()
-        repo.git.add(A=True)
-        repo.git.commit(m=commit_message)
-        logger.info(f"Pushing branch {branch_name}")
-        repo.git.push("origin", branch_name)
-        return True
+        data = file.code.encode("utf-8")
+        path = os.path.join(repo_dir, file.filename)
+
+        old_hash = None
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                old_hash = content_hash(f.read())
+        new_hash = content_hash(data)
+        if new_hash == old_hash:
+            logger.info("Skipping unchanged %s", file.filename)
+        else:
+            logger.info("Writing to %s", file.filename)
+            write_atomic(path, data)
+        change_set.record(file.filename, old_hash, new_hash)
+    logger.info("%s file(s) created, %s file(s) modified", len(change_set.created), len(change_set.modified))
+    return change_set
+
+
+def create_branch(branch_name, repo, commit_message, change_set):
+    """Commit the files of the change set to a new branch and push it. Returns False if nothing changed."""
+    if not change_set:
+        return False
+    logger.info(
+        "Source code has been modified, committing %s file(s) to branch %s", len(change_set.paths), branch_name
+    )
+    new_branch = repo.create_head(branch_name)
+    new_branch.checkout()
+    repo.git.add("--", *change_set.paths)
+    repo.git.commit(m=commit_message)
+    logger.info("Pushing branch %s", branch_name)
+    repo.git.push("origin", branch_name)
+    return True
+
+
+class PullRequestError(Exception):
+    pass
 
 
 class GitProvider(ABC):
@@ -81,7 +185,7 @@ class GitHubProvider(GitProvider):
         }
 
     def create_pull_request(self, branch, title, description):
-        """Create a new pull request for a target branch"""
+        """Create a new pull request for a target branch. Raises PullRequestError if GitHub rejects it."""
         data = {
             "title": title,
             "body": description,
@@ -92,6 +196,9 @@ class GitHubProvider(GitProvider):
         response = requests.post(self.url, json=data, headers=self.headers, timeout=30)
 
         if response.status_code == 201:
-            logger.info(f"Pull request created ({response.json()['html_url']})")
+            pr_url = response.json()["html_url"]
+            logger.info("Pull request created (%s)", pr_url)
+            return pr_url
         else:
-            logger.info(f"Failed to create pull request with error: {response.text}")
\ No newline at end of file
+            logger.error("Failed to create pull request with error: %s", response.text)
+            raise PullRequestError(f"GitHub returned {response.status_code} creating a pull request for {branch}")
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+from utils import get_logger
+
+logger = get_logger()
+
+RUN_HISTORY_PATH = os.environ.get(
+    "RUN_HISTORY_PATH", os.path.join(tempfile.gettempdir(), "spring_upgrade", "history.jsonl")
+)
+# Durable copy of the history shared by all Lambda containers, e.g. s3://bucket/run_history.jsonl. Without it the
+# history only lives on the /tmp of a single container and estimates mostly fall back to the defaults.
+RUN_HISTORY_S3_URI = os.environ.get("RUN_HISTORY_S3_URI")
+RUN_HISTORY_MAX_RECORDS = 1000
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Estimate the number of model tokens of a text without calling the model."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class RunHistory:
+    """Append-only record of model calls and pipeline stage durations, used to estimate future runs.
+
+    Records are appended to a local file. If `s3_uri` is given, the local file is seeded from that object on first
+    use and `flush` merges the records appended since into it.
+    """
+
+    def __init__(self, path=RUN_HISTORY_PATH, max_records=RUN_HISTORY_MAX_RECORDS, s3_uri=RUN_HISTORY_S3_URI):
+        self.path = path
+        self.max_records = max_records
+        self.s3_uri = s3_uri
+        self.pending = []
+        self.pulled = False
+        self.lock = threading.Lock()
+
+    def _s3_object(self):
+        uri = urlparse(self.s3_uri)
+        return boto3.client("s3"), uri.netloc, uri.path.lstrip("/")
+
+    def _download(self):
+        """Return the lines of the durable copy, or None if it could not be read."""
+        s3, bucket, key = self._s3_object()
+        try:
+            return s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode().splitlines(keepends=True)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "NoSuchKey":
+                return []
+            logger.warning("Could not read run history from %s: %s", self.s3_uri, e)
+        except BotoCoreError as e:
+            logger.warning("Could not read run history from %s: %s", self.s3_uri, e)
+        return None
+
+    def _pull(self):
+        """Seed the local file from the durable copy once per container. Must be called holding `lock`."""
+        if not self.s3_uri or self.pulled:
+            return
+        lines = self._download()
+        if lines is None:
+            return
+        self.pulled = True
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w") as f:
+                f.writelines(lines[-self.max_records:] + self.pending)
+        except OSError as e:
+            logger.warning("Could not record run history to %s: %s", self.path, e)
+
+    def append(self, kind, **fields):
+        record = {"kind": kind, "time": round(time.time()), **fields}
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            if self.s3_uri:
+                self.pending.append(line)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(line)
+            except OSError as e:
+                logger.warning("Could not record run history to %s: %s", self.path, e)
+
+    def flush(self):
+        """Merge the records appended since the last flush into the durable copy, if one is configured."""
+        if not self.s3_uri:
+            return
+        with self.lock:
+            if not self.pending:
+                return
+            lines = self._download()
+            if lines is None:
+                return
+            lines = (lines + self.pending)[-self.max_records:]
+            s3, bucket, key = self._s3_object()
+            try:
+                s3.put_object(Bucket=bucket, Key=key, Body="".join(lines).encode())
+            except (BotoCoreError, ClientError) as e:
+                logger.warning("Could not write run history to %s: %s", self.s3_uri, e)
+                return
+            self.pending = []
+
+    def load(self, kind):
+        """Return the most recent records of a kind, oldest first."""
+        with self.lock:
+            self._pull()
+            if not os.path.isfile(self.path):
+                return []
+            with open(self.path, "r") as f:
+                lines = f.readlines()
+            if len(lines) > self.max_records:
+                lines = lines[-self.max_records:]
+                with open(self.path, "w") as f:
+                    f.writelines(lines)
+        records = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("kind") == kind:
+                records.append(record)
+        return records
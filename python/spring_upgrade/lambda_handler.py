@@ -1,13 +1,19 @@
 import os
-import tempfile
 import time
-import glob
 import json
 import asyncio
 
-from git_utils import GitHubProvider, clone_repo, create_branch, update_source_code
+from git_utils import GitHubProvider, PullRequestError, clone_repo, create_branch, update_source_code
+from structured_logging import Redacted
 from utils import get_logger, get_config
-from bedrock import Claude
+from model_router import ModelRouter
+from path_index import PathIndex, list_repo_files
+from symbol_index import select_affected_files
+from test_selection import select_tests
+from validation import compile_and_repair, find_parse_errors
+from workspace import WorkspaceManager
+from history import RunHistory
+from planning import plan_upgrade
 
 logger = get_logger()
 
@@ -23,6 +29,12 @@ MODEL_AWS_REGION = "us-east-1"
 
 SSH_PRIVATE_KEY_FILENAME = "ssh_private_key"
 
+# Per-request directories and caches kept across invocations of a warm container, shared by the repos of a batch
+# run by batch.py
+run_history = RunHistory()
+workspace_manager = WorkspaceManager(history=run_history)
+os.environ.setdefault("MAVEN_REPO_LOCAL", workspace_manager.cache_dir("maven"))
+
 
 def api_response(status_code, body):
     """Return a properly formatted API Gateway proxy response."""
@@ -38,8 +50,9 @@ def lambda_handler(event, context):
     Routes:
       GET  /info            - health/info check
       POST /upgrade-project - trigger Spring upgrade
+      POST /upgrade-project/plan - estimate tokens, model calls and runtime of an upgrade without running it
     """
-    logger.info(f"Processing event: {event}")
+    logger.info("Processing event: %s", Redacted(event))
 
     http_method = event.get("httpMethod", "")
     path = event.get("path", "")
@@ -58,13 +71,13 @@ def lambda_handler(event, context):
             pom_path = body["pom_path"]
             repo_api_url = body["repo_api_url"]
 
-            logger.info(f"Retrieving config")
+            logger.info("Retrieving config")
             config = get_config(PARAMETER_STORE_PREFIX, PARAMETER_NAMES)
             ssh_private_key = config["ssh_private_key"]
             api_key = config["api_key"]
 
-            # Select a model provider to perform the code generation
-            provider = Claude(model_aws_region=MODEL_AWS_REGION)
+            # Select a model provider to perform the code generation, routing each file to a model tier
+            provider = ModelRouter(model_aws_region=MODEL_AWS_REGION, history=run_history)
 
             branch_name = f"upgrade-code-{round(time.time())}"
             # Create a pull request
@@ -75,120 +88,146 @@ def lambda_handler(event, context):
 
             return api_response(200, {"branch_name": branch_name})
 
+        elif http_method == "POST" and path == "/upgrade-project/plan":
+            body = event.get("body") or "{}"
+            if isinstance(body, str):
+                body = json.loads(body)
+
+            spring_version = body["spring_version"]
+            repo_url = body["github_url"]
+
+            logger.info("Retrieving config")
+            config = get_config(PARAMETER_STORE_PREFIX, PARAMETER_NAMES)
+
+            plan = plan_project(spring_version, repo_url, config["ssh_private_key"], context)
+            return api_response(200, plan)
+
         else:
             return api_response(404, {"error": f"Route {http_method} {path} not found"})
 
+    except PullRequestError as e:
+        logger.exception("Pull request failed: %s", e)
+        return api_response(502, {"error": str(e)})
     except KeyError as e:
-        logger.exception(f"Missing required field: {e}")
+        logger.exception("Missing required field: %s", e)
         return api_response(400, {"error": f"Missing required field: {str(e)}"})
     except json.JSONDecodeError as e:
-        logger.exception(f"Invalid JSON body: {e}")
+        logger.exception("Invalid JSON body: %s", e)
         return api_response(400, {"error": "Invalid JSON body"})
     except Exception as e:
-        logger.exception(f"Internal error: {e}")
+        logger.exception("Internal error: %s", e)
         return api_response(500, {"error": "Internal server error"})
+    finally:
+        # Share the durations and token counts of this request with other containers
+        run_history.flush()
 
-async def upgrade_code(spring_version, provider, api_key, repo_api_url, repo_url, branch_name, ssh_private_key, pom_path,context):
+def clone_and_scan(workspace, spring_version, repo_url, ssh_private_key):
+    """Clone a repo into the workspace and select the files to upgrade.
+
+    Returns the repo, its directory, the map of all files, its path index and the map of files to upgrade.
+    """
     repo_name = repo_url.split("/")[-1]
 
     # Prepare SSH credentials for cloning the target repo
-    tmpdir = tempfile.mkdtemp()
-    ssh_private_key_path = os.path.join(tmpdir, "ssh_private_key")
+    ssh_private_key_path = os.path.join(workspace.path, SSH_PRIVATE_KEY_FILENAME)
     write_ssh_key(ssh_private_key, ssh_private_key_path)
-    
-    git_provider = GitHubProvider(api_key, repo_api_url)
-    
-     # Clone the target repo
-    target_repo_dir = os.path.join(tmpdir, context.aws_request_id, repo_name)
-    repo = clone_repo(repo_url, target_repo_dir, ssh_private_key_path)
 
-    # Create a map of filenames with the actual filenames in the target repo
-    source_code_map = create_source_code_map(target_repo_dir)
+    # Clone the target repo, borrowing objects from a cached mirror
+    target_repo_dir = os.path.join(workspace.path, repo_name)
+    with workspace.stage("clone"):
+        repo = clone_repo(repo_url, target_repo_dir, ssh_private_key_path, workspace_manager.cache_dir("git"))
+
+    with workspace.stage("scan"):
+        # Create a map of repo-relative filenames to their contents
+        source_code_map = create_source_code_map(target_repo_dir)
+        path_index = PathIndex(target_repo_dir, source_code_map)
 
-    # Trigger the code generation 
-    result = provider.upgrade_code(spring_version, source_code_map)
+        # Send only the files referencing symbols affected by the target version, plus their direct dependencies
+        symbol_index_path = os.path.join(workspace_manager.cache_dir("symbol_index"), "symbol_index.json")
+        affected_source_code_map = select_affected_files(
+            source_code_map, spring_version, path_index, symbol_index_path
+        )
+    return repo, target_repo_dir, source_code_map, path_index, affected_source_code_map
 
-    # Modify the local cloned repo with the generated code
-    update_source_code(result.code, target_repo_dir)
 
-    # trigger code unit testing
-    test_path = os.path.join(target_repo_dir, pom_path)
-    test_result = provider.test_code(test_path)
+def plan_project(spring_version, repo_url, ssh_private_key, context):
+    """Clone and scan a repo and estimate its upgrade, without calling the model or pushing anything."""
+    with workspace_manager.workspace(context.aws_request_id) as workspace:
+        _, _, source_code_map, _, affected_source_code_map = clone_and_scan(
+            workspace, spring_version, repo_url, ssh_private_key
+        )
+        router = ModelRouter(model_aws_region=MODEL_AWS_REGION, history=run_history)
+        return plan_upgrade(source_code_map, affected_source_code_map, router, run_history)
 
-    logger.info(f"Updated source code for brance {branch_name}.")
 
-    # Create a branch and commit/push the code to the source repo
-    branch_created = create_branch(branch_name, repo, result.description)
-    if not branch_created:
-        logger.info("No changes were made, exiting.")
-        return
+async def upgrade_code(spring_version, provider, api_key, repo_api_url, repo_url, branch_name, ssh_private_key, pom_path,context):
+    """Upgrade a repo and open a pull request. Returns the pull request URL, or None if nothing changed.
+
+    Raises PullRequestError if the branch was pushed but GitHub rejected the pull request.
+    """
+    # All files of the request live in a workspace directory removed when the request finishes
+    with workspace_manager.workspace(context.aws_request_id) as workspace:
+        git_provider = GitHubProvider(api_key, repo_api_url)
+
+        repo, target_repo_dir, source_code_map, path_index, affected_source_code_map = clone_and_scan(
+            workspace, spring_version, repo_url, ssh_private_key
+        )
+
+        with workspace.stage("generate"):
+            # Trigger the code generation and map the returned filenames back to the repo
+            result = provider.upgrade_code(spring_version, affected_source_code_map, validator=find_parse_errors)
+            result = path_index.resolve_response(result)
+
+            # Modify the local cloned repo with the generated code
+            change_set = update_source_code(result.code, target_repo_dir)
+
+        with workspace.stage("compile"):
+            # Compile the affected modules and repair failing files before running the tests
+            result = compile_and_repair(
+                provider, spring_version, result, target_repo_dir, path_index, change_set
+            )
+
+        with workspace.stage("test"):
+            # trigger code unit testing, limited to the modules and tests affected by the changed files
+            test_path = os.path.join(target_repo_dir, pom_path)
+            selection = select_tests(target_repo_dir, test_path, change_set.paths)
+            test_result = provider.test_code(test_path, selection)
+
+        logger.info("Updated source code for brance %s.", branch_name)
+
+        with workspace.stage("publish"):
+            # Create a branch and commit/push the code to the source repo
+            branch_created = create_branch(branch_name, repo, result.description, change_set)
+            if not branch_created:
+                logger.info("No changes were made, exiting.")
+                return None
 
-    # Create a pull request
-    pr_description = f"{result.description} \n {test_result['messages'][-1].content}"
-    git_provider.create_pull_request(branch_name, result.title, pr_description)
+            # Create a pull request
+            pr_description = f"{result.description} \n {test_result['messages'][-1].content}"
+            pr_url = git_provider.create_pull_request(branch_name, result.title, pr_description)
 
-    logger.info(f"Created pull request for branch {branch_name}.")
+        logger.info("Created pull request for branch %s.", branch_name)
+        return pr_url
 
 
 def write_ssh_key(value, file_path):
     """Retrieve git SSH private key from SSM and write to file."""
-    logger.info(f"Writing SSH key to {file_path}")
+    logger.info("Writing SSH key to %s", file_path)
     with open(file_path, "w") as f:
         f.write(value)
     os.chmod(file_path, int("600", base=8))
 
 
-def find_partial_matches(primary_paths, secondary_paths):
-    """Find and return partial matches between file paths in two lists based on filenames.
-
-    This function compares file paths in the `primary_paths` list to those in the `secondary_paths` list
-    and returns a list of partial matches if matching filenames are found, regardless of the root directory.
-
-    Example:
-        primary_paths = [
-            '/var/task/handlers/create_order.py'
-        ]
-        secondary_paths = [
-            '.gitignore',
-            'README.md',
-            'src',
-            'template.yaml',
-            'src/handlers',
-            'src/requirements.txt',
-            'src/handlers/create_order.py',
-            'src/handlers/sample.py'
-        ]
-        results = find_partial_matches(primary_paths, secondary_paths)
-
-    Returns:
-        ['src/handlers/sample.py'] if a partial match is found, or an empty list if no matches are found.
-    """
-    results = []
-
-    for primary_path in primary_paths:
-        primary_filename = os.path.basename(primary_path)
-        for secondary_path in secondary_paths:
-            secondary_filename = os.path.basename(secondary_path)
-            if primary_filename == secondary_filename:
-                results.append(secondary_path)
-
-    return results
-
-
 def create_source_code_map(repo_dir):
-    """Create a map of relevant filenames with the actual filenames in the target repo."""
-    logger.info(f"Creating source code map for {repo_dir}.")
+    """Create a map of repo-relative filenames to the file contents of the target repo."""
+    logger.info("Creating source code map for %s.", repo_dir)
     source_code_map = {}
-    pattern = os.path.join(repo_dir, '**/*')
-    file_paths_in_repo = glob.glob(pattern, recursive=True)
-    for filename in file_paths_in_repo:
-        if (os.path.isdir(filename)):
-            continue
+    for filename in list_repo_files(repo_dir):
         with open(os.path.join(repo_dir, filename), "r") as f:
             try:
                 source_code_map[filename] = f.read()
             except Exception as e:
-                logger.warning(f"Failed parsing file {filename}")
+                logger.warning("Failed parsing file %s", filename)
                 continue
     return source_code_map
 
@@ -0,0 +1,122 @@
+import os
+import re
+import subprocess
+
+from utils import get_logger
+
+logger = get_logger()
+
+MAVEN_TIMEOUT = 600
+# Local repository shared by all builds, e.g. a cache directory on /tmp when $HOME is not writable
+MAVEN_REPO_LOCAL_ENV = "MAVEN_REPO_LOCAL"
+# Build files, whose changes affect every module of a project
+BUILD_FILENAMES = {"pom.xml", "build.gradle", "build.gradle.kts", "settings.gradle", "settings.gradle.kts"}
+COMPILER_ERROR_PATTERN = re.compile(r"^(?P<path>.+?\.java):\[(?P<line>\d+),(?P<column>\d+)\] (?P<message>.*)$")
+# Details javac prints below an error, e.g. the `symbol:` and `location:` of a "cannot find symbol" error
+COMPILER_DETAIL_PATTERN = re.compile(r"^\s+\S")
+
+
+def is_within(path, directory):
+    """Return whether a path is the given directory or below it."""
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+def find_module_pom(repo_dir, filename):
+    """Return the pom.xml of the Maven module owning the given file, or None if it is outside any module."""
+    repo_dir = os.path.abspath(repo_dir)
+    directory = os.path.dirname(os.path.abspath(os.path.join(repo_dir, filename)))
+    while is_within(directory, repo_dir):
+        pom = os.path.join(directory, "pom.xml")
+        if os.path.isfile(pom):
+            return pom
+        if directory == repo_dir:
+            break
+        directory = os.path.dirname(directory)
+    return None
+
+
+def find_module_poms(repo_dir, filenames):
+    """Return the sorted pom.xml paths of the Maven modules owning the given files."""
+    poms = {find_module_pom(repo_dir, filename) for filename in filenames}
+    poms.discard(None)
+    return sorted(poms)
+
+
+def find_reactor_pom(repo_dir, pom):
+    """Return the pom.xml of the outermost project enclosing a module, following parent directories with a pom.xml."""
+    repo_dir = os.path.abspath(repo_dir)
+    reactor_pom = os.path.abspath(pom)
+    directory = os.path.dirname(reactor_pom)
+    while directory != repo_dir and is_within(directory, repo_dir):
+        directory = os.path.dirname(directory)
+        parent_pom = os.path.join(directory, "pom.xml")
+        if not os.path.isfile(parent_pom):
+            break
+        reactor_pom = parent_pom
+    return reactor_pom
+
+
+def maven_repo_options():
+    """Return the options pointing Maven at the shared local repository, if one is configured."""
+    maven_repo_local = os.environ.get(MAVEN_REPO_LOCAL_ENV)
+    return [f"-Dmaven.repo.local={maven_repo_local}"] if maven_repo_local else []
+
+
+def run_maven(args, timeout=MAVEN_TIMEOUT):
+    """Run Maven with the given arguments and return the completed process."""
+    command = ["mvn", "-B", *maven_repo_options(), *args]
+    logger.info("Running: %s", " ".join(command))
+    return subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+
+
+def parse_compiler_errors(output):
+    """Return the compiler errors in Maven output as a map of file path to messages.
+
+    Maven reports each error twice, in the compiler output and in the summary of the failed goal, so messages
+    are de-duplicated. Indented detail lines following an error are kept as part of its message.
+    """
+    errors = {}
+    current = None
+    for line in output.splitlines():
+        is_error = line.startswith("[ERROR] ")
+        if is_error:
+            line = line[len("[ERROR] "):]
+        match = COMPILER_ERROR_PATTERN.match(line) if is_error else None
+        if match:
+            current = [f"line {match['line']}, column {match['column']}: {match['message']}"]
+            errors.setdefault(match["path"], []).append(current)
+        elif current and COMPILER_DETAIL_PATTERN.match(line):
+            current.append(line.strip())
+        else:
+            current = None
+    return {path: list(dict.fromkeys("\n".join(lines) for lines in messages)) for path, messages in errors.items()}
+
+
+def compile_modules(reactor_pom, module_poms):
+    """Compile modules offline from their reactor, together with the sibling modules they depend on.
+
+    Returns the compiler errors as a map of file path to messages, or None when the build failed for reasons
+    other than compiler errors (e.g. dependencies missing from the local repository), as the result is then
+    inconclusive.
+    """
+    reactor_dir = os.path.dirname(os.path.abspath(reactor_pom))
+    modules = sorted(os.path.relpath(os.path.dirname(os.path.abspath(pom)), reactor_dir) for pom in module_poms)
+    args = ["-o", "-q", "compile", "-f", reactor_pom]
+    if "." not in modules:
+        args += ["-pl", ",".join(modules), "-am"]
+    try:
+        result = run_maven(args)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning("Could not compile %s: %s", reactor_pom, e)
+        return None
+    if result.returncode == 0:
+        return {}
+
+    errors = parse_compiler_errors(result.stdout)
+    if not errors:
+        logger.warning(
+            "Compilation of %s failed without compiler errors:\n%s", reactor_pom, result.stdout[-2000:]
+        )
+        return None
+    return errors
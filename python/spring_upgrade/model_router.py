@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+
+from bedrock import Claude, CodeUpgradeResponse, DEFAULT_MODEL, DEFAULT_MODEL_REGION
+from history import estimate_tokens
+from maven import BUILD_FILENAMES
+from utils import get_logger
+
+logger = get_logger()
+
+SONNET_MODEL = "global.anthropic.claude-sonnet-4-5-20250929-v1:0"
+OPUS_MODEL = "global.anthropic.claude-opus-4-5-20251101-v1:0"
+
+# Environment variable holding a JSON list of tiers, e.g. [{"name": "fast", "model_id": "...", "max_score": 10}]
+MODEL_TIERS_ENV = "MODEL_TIERS"
+# Upper bound of estimated source tokens per model call, so the rewritten files fit in the response
+MAX_BATCH_TOKENS = int(os.environ.get("MAX_BATCH_TOKENS", "8000"))
+
+SPRING_API_PATTERN = re.compile(r"\b(?:org\.springframework|javax|jakarta)\.[\w.]+")
+SECURITY_API_PATTERN = re.compile(r"\b(?:WebSecurityConfigurerAdapter|SecurityFilterChain|HttpSecurity)\b")
+
+BUILD_FILE_SCORE = 15
+SECURITY_SCORE = 15
+SPRING_API_SCORE = 2
+CHARS_PER_SIZE_POINT = 2000
+
+
+class ModelTier(BaseModel):
+    name: str
+    model_id: str
+    # Highest complexity score routed to this tier. The last tier takes everything above.
+    max_score: Optional[float] = None
+
+
+class TierStats(BaseModel):
+    calls: int = 0
+    successes: int = 0
+    failures: int = 0
+    total_latency: float = 0.0
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.calls if self.calls else 0.0
+
+
+DEFAULT_MODEL_TIERS = [
+    ModelTier(name="fast", model_id=DEFAULT_MODEL, max_score=10),
+    ModelTier(name="standard", model_id=SONNET_MODEL, max_score=40),
+    ModelTier(name="strong", model_id=OPUS_MODEL),
+]
+
+
+def load_model_tiers():
+    """Load model tiers from the environment, falling back to the defaults."""
+    tiers_json = os.environ.get(MODEL_TIERS_ENV)
+    if not tiers_json:
+        return DEFAULT_MODEL_TIERS
+    return [ModelTier(**tier) for tier in json.loads(tiers_json)]
+
+
+def score_complexity(filename, source_code):
+    """Score how hard a file is to upgrade from its size, Spring APIs referenced and whether it is a build file."""
+    score = len(source_code) / CHARS_PER_SIZE_POINT
+    score += SPRING_API_SCORE * len(set(SPRING_API_PATTERN.findall(source_code)))
+    if SECURITY_API_PATTERN.search(source_code):
+        score += SECURITY_SCORE
+    if os.path.basename(filename) in BUILD_FILENAMES:
+        score += BUILD_FILE_SCORE
+    return score
+
+
+def merge_responses(responses):
+    """Merge the responses of several batches into a single response."""
+    if len(responses) == 1:
+        return responses[0]
+    code = {}
+    for response in responses:
+        for file in response.code:
+            code[file.filename] = file
+    return CodeUpgradeResponse(
+        code=list(code.values()),
+        title=responses[0].title,
+        description="\n\n".join(response.description for response in responses),
+    )
+
+
+def empty_response(version):
+    """Return the response of an upgrade without any files to change."""
+    return CodeUpgradeResponse(
+        title=f"Upgrade to {version}", description="No files reference symbols affected by the upgrade."
+    )
+
+
+class ModelRouter:
+    """Route upgrade work to the cheapest model tier able to handle it.
+
+    Files are scored by `score_complexity` and batched per tier. When a validator reports errors for a
+    batch, the failing files are escalated to the next stronger tier.
+    """
+
+    def __init__(self, tiers=None, model_aws_region=DEFAULT_MODEL_REGION, history=None, max_batch_tokens=MAX_BATCH_TOKENS):
+        self.tiers = tiers or load_model_tiers()
+        self.model_aws_region = model_aws_region
+        self.history = history
+        self.max_batch_tokens = max_batch_tokens
+        self.stats = {tier.name: TierStats() for tier in self.tiers}
+        self._models = {}
+
+    def _model(self, tier_index):
+        """Return the model for a tier, initializing it on first use."""
+        if tier_index not in self._models:
+            tier = self.tiers[tier_index]
+            self._models[tier_index] = Claude(model_id=tier.model_id, model_aws_region=self.model_aws_region)
+        return self._models[tier_index]
+
+    def tier_for_score(self, score):
+        """Return the index of the first tier accepting the given score."""
+        for index, tier in enumerate(self.tiers):
+            if tier.max_score is None or score <= tier.max_score:
+                return index
+        return len(self.tiers) - 1
+
+    def route(self, source_code_map):
+        """Split the source code map into batches keyed by tier index."""
+        batches = {}
+        for filename, source_code in source_code_map.items():
+            tier_index = self.tier_for_score(score_complexity(filename, source_code))
+            batches.setdefault(tier_index, {})[filename] = source_code
+        return batches
+
+    def plan_batches(self, source_code_map):
+        """Return the (tier index, batch) pairs of model calls, splitting each tier's files by `max_batch_tokens`."""
+        planned = []
+        for tier_index, batch in sorted(self.route(source_code_map).items()):
+            current, current_tokens = {}, 0
+            for filename, source_code in sorted(batch.items()):
+                tokens = estimate_tokens(source_code)
+                if current and current_tokens + tokens > self.max_batch_tokens:
+                    planned.append((tier_index, current))
+                    current, current_tokens = {}, 0
+                current[filename] = source_code
+                current_tokens += tokens
+            if current:
+                planned.append((tier_index, current))
+        return planned
+
+    def upgrade_code(self, version, source_code_map, validator=None):
+        """Upgrade each batch on its tier and merge the results. No model is called for an empty map."""
+        batches = self.plan_batches(source_code_map)
+        if not batches:
+            logger.info("No files to upgrade, skipping the model")
+            return empty_response(version)
+        responses = []
+        for tier_index, batch in batches:
+            logger.info("Routing %s file(s) to tier %s", len(batch), self.tiers[tier_index].name)
+            responses.append(self._upgrade_batch(version, batch, tier_index, validator))
+        self.log_stats()
+        return merge_responses(responses)
+
+    def _upgrade_batch(self, version, batch, tier_index, validator):
+        """Upgrade a batch, escalating failing files to stronger tiers."""
+        tier = self.tiers[tier_index]
+        stats = self.stats[tier.name]
+        start = time.perf_counter()
+        try:
+            response = self._model(tier_index).upgrade_code(version, batch)
+        finally:
+            latency = time.perf_counter() - start
+            stats.calls += 1
+            stats.total_latency += latency
+        self._record_call(tier, batch, response, latency)
+
+        errors = validator(response.code) if validator else {}
+        if not errors:
+            stats.successes += 1
+            return response
+        stats.failures += 1
+
+        if tier_index + 1 >= len(self.tiers):
+            logger.warning("Validation failed on the strongest tier %s, keeping its output", tier.name)
+            return response
+
+        retry_batch = {filename: batch[filename] for filename in errors if filename in batch} or batch
+        logger.info(
+            "Escalating %s file(s) from tier %s to %s", len(retry_batch), tier.name, self.tiers[tier_index + 1].name
+        )
+        escalated = self._upgrade_batch(version, retry_batch, tier_index + 1, validator)
+        return merge_responses([response, escalated])
+
+    def repair_code(self, version, source_code_map, errors, validator=None):
+        """Repair files which failed to compile, one tier above the tier each file was routed to.
+
+        A repair succeeds when every file of its batch is returned and passes the validator, if given.
+        """
+        if not source_code_map:
+            return empty_response(version)
+        responses = []
+        for tier_index, batch in sorted(self.route(source_code_map).items()):
+            tier_index = min(tier_index + 1, len(self.tiers) - 1)
+            tier = self.tiers[tier_index]
+            stats = self.stats[tier.name]
+            batch_errors = {filename: errors[filename] for filename in batch if filename in errors}
+            logger.info("Repairing %s file(s) on tier %s", len(batch), tier.name)
+            start = time.perf_counter()
+            try:
+                response = self._model(tier_index).repair_code(version, batch, batch_errors)
+            finally:
+                latency = time.perf_counter() - start
+                stats.calls += 1
+                stats.total_latency += latency
+            self._record_call(tier, batch, response, latency)
+            returned = {file.filename for file in response.code}
+            if set(batch) <= returned and not (validator and validator(response.code)):
+                stats.successes += 1
+            else:
+                stats.failures += 1
+            responses.append(response)
+        self.log_stats()
+        return merge_responses(responses)
+
+    def test_code(self, code_dir, selection=None):
+        """Run the test agent on the cheapest tier."""
+        return self._model(0).test_code(code_dir, selection)
+
+    def _record_call(self, tier, batch, response, latency):
+        """Record the estimated token counts and latency of a model call in the run history."""
+        if self.history is None:
+            return
+        self.history.append(
+            "model_call",
+            tier=tier.name,
+            input_tokens=sum(estimate_tokens(source_code) for source_code in batch.values()),
+            output_tokens=sum(estimate_tokens(file.code) for file in response.code),
+            latency=round(latency, 3),
+        )
+
+    def log_stats(self):
+        for name, stats in self.stats.items():
+            if stats.calls:
+                logger.info(
+                    "Tier %s: calls=%s successes=%s failures=%s average_latency=%.2fs",
+                    name, stats.calls, stats.successes, stats.failures, stats.average_latency,
+                )
@@ -0,0 +1,68 @@
+import glob
+import os
+import posixpath
+
+from utils import get_logger
+
+logger = get_logger()
+
+
+def list_repo_files(repo_dir):
+    """Return the repo-relative paths of all files in the repo, excluding hidden directories."""
+    pattern = os.path.join(repo_dir, "**", "*")
+    return sorted(
+        os.path.relpath(path, repo_dir).replace(os.sep, "/")
+        for path in glob.glob(pattern, recursive=True)
+        if not os.path.isdir(path)
+    )
+
+
+class PathIndex:
+    """Resolve filenames returned by the model to repo-relative paths.
+
+    Every path suffix (e.g. `Person.java`, `helloworld/Person.java`) is indexed, so a filename resolves with a
+    single dictionary lookup whether the model returned the full path or only a trailing part of it.
+    """
+
+    def __init__(self, repo_dir, paths):
+        self.repo_dir = os.path.abspath(repo_dir)
+        self.paths = set(paths)
+        self.suffixes = {}
+        for path in self.paths:
+            parts = path.split("/")
+            for i in range(len(parts)):
+                self.suffixes.setdefault("/".join(parts[i:]), []).append(path)
+
+    def resolve(self, filename):
+        """Return the repo-relative path for a filename.
+
+        Unknown filenames are treated as new files. Raises ValueError for paths outside the repo and for
+        suffixes matching several files.
+        """
+        path = filename.replace("\\", "/")
+        if os.path.isabs(path):
+            if os.path.commonpath([self.repo_dir, os.path.abspath(path)]) != self.repo_dir:
+                raise ValueError(f"Path {filename} is outside the repo")
+            path = os.path.relpath(path, self.repo_dir).replace(os.sep, "/")
+        path = posixpath.normpath(path)
+        if path == ".." or path.startswith("../"):
+            raise ValueError(f"Path {filename} is outside the repo")
+
+        if path in self.paths:
+            return path
+        matches = self.suffixes.get(path, [])
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            raise ValueError(f"Path {filename} matches several files: {sorted(matches)}")
+        return path
+
+    def resolve_response(self, response):
+        """Return a copy of a `CodeUpgradeResponse` with resolved filenames, dropping unresolvable files."""
+        files = []
+        for file in response.code:
+            try:
+                files.append(file.model_copy(update={"filename": self.resolve(file.filename)}))
+            except ValueError as e:
+                logger.warning("Skipping generated file: %s", e)
+        return response.model_copy(update={"code": files})
@@ -0,0 +1,78 @@
+from history import estimate_tokens
+from utils import get_logger
+
+logger = get_logger()
+
+# Used until the run history has recorded model calls and stages. The model returns whole files, so output
+# is assumed to be about as large as the input.
+DEFAULT_OUTPUT_RATIO = 1.0
+DEFAULT_SECONDS_PER_1K_TOKENS = 15.0
+DEFAULT_STAGE_SECONDS = {"clone": 10.0, "scan": 2.0, "compile": 60.0, "test": 180.0, "publish": 5.0}
+
+
+def model_call_rates(records):
+    """Return the output/input token ratio and seconds per 1k tokens observed in model call records."""
+    input_tokens = sum(record["input_tokens"] for record in records)
+    output_tokens = sum(record["output_tokens"] for record in records)
+    latency = sum(record["latency"] for record in records)
+    if not input_tokens:
+        return DEFAULT_OUTPUT_RATIO, DEFAULT_SECONDS_PER_1K_TOKENS
+    return output_tokens / input_tokens, latency / (input_tokens + output_tokens) * 1000
+
+
+def average_stage_seconds(records):
+    """Return the average recorded duration of each non-model pipeline stage."""
+    durations = {}
+    for record in records:
+        durations.setdefault(record["stage"], []).append(record["duration"])
+    averages = dict(DEFAULT_STAGE_SECONDS)
+    averages.update({stage: sum(values) / len(values) for stage, values in durations.items()})
+    averages.pop("generate", None)
+    return averages
+
+
+def plan_upgrade(source_code_map, affected_source_code_map, router, history):
+    """Estimate the model calls, tokens and wall-clock time of an upgrade without calling the model.
+
+    Files are batched exactly as `ModelRouter.upgrade_code` would batch them. Repair rounds and escalations
+    only happen on validation failures and are not included. Rates and stage durations come from the run history
+    and fall back to the `DEFAULT_*` constants while it is empty, e.g. on a cold container without
+    `RUN_HISTORY_S3_URI`. `history_samples` in the plan reports how many records the estimate is based on.
+    """
+    call_records = history.load("model_call")
+    stage_records = history.load("stage")
+
+    batches = []
+    for tier_index, batch in router.plan_batches(affected_source_code_map):
+        tier = router.tiers[tier_index]
+        tier_records = [record for record in call_records if record["tier"] == tier.name] or call_records
+        output_ratio, seconds_per_1k_tokens = model_call_rates(tier_records)
+        input_tokens = sum(estimate_tokens(source_code) for source_code in batch.values())
+        output_tokens = round(input_tokens * output_ratio)
+        batches.append({
+            "tier": tier.name,
+            "model_id": tier.model_id,
+            "files": {filename: estimate_tokens(source_code) for filename, source_code in batch.items()},
+            "input_tokens": input_tokens,
+            "estimated_output_tokens": output_tokens,
+            "estimated_seconds": round((input_tokens + output_tokens) / 1000 * seconds_per_1k_tokens, 1),
+        })
+
+    stage_seconds = average_stage_seconds(stage_records)
+    model_seconds = sum(batch["estimated_seconds"] for batch in batches)
+    plan = {
+        "total_files": len(source_code_map),
+        "selected_files": len(affected_source_code_map),
+        "input_tokens": sum(batch["input_tokens"] for batch in batches),
+        "estimated_bedrock_calls": len(batches),
+        "estimated_output_tokens": sum(batch["estimated_output_tokens"] for batch in batches),
+        "estimated_wall_clock_seconds": round(model_seconds + sum(stage_seconds.values()), 1),
+        "estimated_stage_seconds": {"generate": round(model_seconds, 1), **stage_seconds},
+        "history_samples": {"model_calls": len(call_records), "stages": len(stage_records)},
+        "batches": batches,
+    }
+    logger.info(
+        "Planned %s model call(s) for %s file(s), about %ss",
+        plan["estimated_bedrock_calls"], plan["selected_files"], plan["estimated_wall_clock_seconds"],
+    )
+    return plan
@@ -0,0 +1,128 @@
+"""Logging shared by the spring upgrade, authorizer and example backend Lambdas.
+
+Records are written as single-line JSON, messages are truncated and scrubbed of secrets, and INFO/DEBUG
+records can be sampled per logger. Configuration is read from the environment:
+
+    LOG_LEVEL               Root log level (default INFO).
+    LOG_SAMPLE_RATES        Comma separated `<logger>=<rate>` pairs, e.g. `authorizer=0.1`.
+    LOG_MAX_MESSAGE_LENGTH  Messages longer than this are truncated (default 2000).
+"""
+import json
+import logging
+import os
+import random
+import re
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_MAX_MESSAGE_LENGTH = int(os.environ.get("LOG_MAX_MESSAGE_LENGTH", "2000"))
+
+REDACTED = "[REDACTED]"
+SENSITIVE_KEYS = ("token", "authorization", "password", "secret", "api_key", "private_key", "cookie")
+SENSITIVE_PATTERNS = [
+    (re.compile(r"(Bearer\s+)[\w\-.~+/=]+"), r"\1" + REDACTED),
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*"), REDACTED),
+    (re.compile(r"-----BEGIN [A-Z ]*PRIVATE KEY-----.*?-----END [A-Z ]*PRIVATE KEY-----", re.DOTALL), REDACTED),
+]
+
+
+def parse_sample_rates(value):
+    """Parse `LOG_SAMPLE_RATES` into a map of logger name to sampling rate."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", ""))
+
+
+def redact(value):
+    """Return a copy of a dict/list structure with the values of sensitive keys replaced."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if any(sensitive in str(key).lower() for sensitive in SENSITIVE_KEYS) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+def scrub(message):
+    """Remove bearer tokens, JWTs and private keys from a message."""
+    for pattern, replacement in SENSITIVE_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+def truncate(message, max_length=LOG_MAX_MESSAGE_LENGTH):
+    if len(message) <= max_length:
+        return message
+    return f"{message[:max_length]}... [truncated {len(message) - max_length} chars]"
+
+
+class Redacted:
+    """Lazily render a structure as redacted JSON, only if the log record is actually emitted.
+
+    Usage: `logger.info("Processing event: %s", Redacted(event))`
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(redact(self.value), default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON with truncated, scrubbed messages."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(scrub(record.getMessage())),
+        }
+        request_id = getattr(record, "aws_request_id", None)
+        if request_id:
+            entry["aws_request_id"] = request_id
+        if record.exc_info:
+            entry["exception"] = truncate(scrub(self.formatException(record.exc_info)))
+        return json.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through a fraction of INFO and DEBUG records. Warnings and errors are always kept."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def configure_logging():
+    """Configure the root logger compatible with local python interpreter and Lambda."""
+    root = logging.getLogger()
+    if len(root.handlers) > 0:
+        # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
+        # `.basicConfig` does not execute. Thus we set the level directly.
+        root.setLevel(LOG_LEVEL)
+    else:
+        logging.basicConfig(level=LOG_LEVEL)
+    for handler in root.handlers:
+        if not isinstance(handler.formatter, JsonFormatter):
+            handler.setFormatter(JsonFormatter())
+
+
+def get_logger(name=None):
+    """Return a logger writing JSON records, sampled according to `LOG_SAMPLE_RATES`."""
+    configure_logging()
+    logger = logging.getLogger(name)
+    rate = LOG_SAMPLE_RATES.get(name or "root")
+    if rate is not None and rate < 1 and not any(isinstance(f, SamplingFilter) for f in logger.filters):
+        logger.addFilter(SamplingFilter(rate))
+    return logger
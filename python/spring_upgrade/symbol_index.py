@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import deque
+
+from git_utils import write_atomic
+from maven import BUILD_FILENAMES
+from utils import get_logger
+
+logger = get_logger()
+
+SYMBOL_INDEX_CACHE_PATH = os.environ.get(
+    "SYMBOL_INDEX_CACHE", os.path.join(tempfile.gettempdir(), "spring_upgrade_cache", "symbol_index.json")
+)
+SCANNED_EXTENSIONS = (".java", ".xml", ".yml", ".yaml", ".properties", ".factories", ".imports")
+JAVA_IMPORT_PATTERN = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+?)(?:\.\*)?\s*;", re.MULTILINE)
+YAML_EXTENSIONS = (".yml", ".yaml")
+YAML_KEY_PATTERN = re.compile(r"^(?P<indent>\s*)(?:-\s+)?(?P<key>[\w.\-\[\]\"']+)\s*:(?:\s|$)")
+# The symbol index cache file is shared by the projects of a batch running in parallel
+cache_lock = threading.Lock()
+
+# Symbols which are deprecated, removed or relocated, with the first Spring Boot version affected by them.
+DEPRECATED_SYMBOLS = {
+    "spring.profiles:": (2, 4),
+    "spring.profiles=": (2, 4),
+    "spring.datasource.initialization-mode": (2, 5),
+    "spring.datasource.schema": (2, 5),
+    "spring.datasource.data": (2, 5),
+    "WebSecurityConfigurerAdapter": (2, 7),
+    "org.springframework.boot.web.server.LocalServerPort": (2, 7),
+    "org.springframework.boot.autoconfigure.EnableAutoConfiguration=": (2, 7),
+    # Jakarta EE 9 relocated these javax packages to jakarta. The javax.annotation, javax.security and javax.xml
+    # entries are narrowed to the APIs which moved, the rest of those packages is part of the JDK.
+    "javax.activation": (3, 0),
+    "javax.annotation.Generated": (3, 0),
+    "javax.annotation.ManagedBean": (3, 0),
+    "javax.annotation.PostConstruct": (3, 0),
+    "javax.annotation.PreDestroy": (3, 0),
+    "javax.annotation.Priority": (3, 0),
+    "javax.annotation.Resource": (3, 0),
+    "javax.annotation.security": (3, 0),
+    "javax.annotation.sql": (3, 0),
+    "javax.batch": (3, 0),
+    "javax.decorator": (3, 0),
+    "javax.ejb": (3, 0),
+    "javax.el": (3, 0),
+    "javax.enterprise": (3, 0),
+    "javax.faces": (3, 0),
+    "javax.inject": (3, 0),
+    "javax.interceptor": (3, 0),
+    "javax.jms": (3, 0),
+    "javax.json": (3, 0),
+    "javax.jws": (3, 0),
+    "javax.mail": (3, 0),
+    "javax.persistence": (3, 0),
+    "javax.resource": (3, 0),
+    "javax.security.auth.message": (3, 0),
+    "javax.security.enterprise": (3, 0),
+    "javax.security.jacc": (3, 0),
+    "javax.servlet": (3, 0),
+    "javax.transaction": (3, 0),
+    "javax.validation": (3, 0),
+    "javax.websocket": (3, 0),
+    "javax.ws.rs": (3, 0),
+    "javax.xml.bind": (3, 0),
+    "javax.xml.soap": (3, 0),
+    "javax.xml.ws": (3, 0),
+    "org.springframework.boot.context.properties.ConstructorBinding": (3, 0),
+    "antMatchers": (3, 0),
+    "mvcMatchers": (3, 0),
+    "authorizeRequests": (3, 0),
+    "setUseTrailingSlashMatch": (3, 0),
+    "spring.redis.": (3, 0),
+    "server.max-http-header-size": (3, 0),
+    "management.metrics.export.": (3, 0),
+    "spring.jpa.hibernate.use-new-id-generator-mappings": (3, 0),
+}
+
+
+def flatten_yaml_keys(source_code):
+    """Return the keys of a YAML file as dotted property paths, one `path: value` or `path.` line per key.
+
+    A `host` key nested below `redis` and `spring` becomes `spring.redis.host: <value>`, so YAML files match the
+    same symbols as `.properties` files.
+    """
+    lines = []
+    parents = []
+    for line in source_code.splitlines():
+        if line.strip() == "---":
+            parents = []
+            continue
+        match = YAML_KEY_PATTERN.match(line)
+        if not match or line.lstrip().startswith("#"):
+            continue
+        indent = match.start("key")
+        while parents and parents[-1][0] >= indent:
+            parents.pop()
+        path = ".".join([key for _, key in parents] + [match["key"].strip("\"'")])
+        parents.append((indent, match["key"].strip("\"'")))
+        value = line[match.end():].strip()
+        # Keys holding a nested mapping end in a dot, so `spring.profiles.active` does not match `spring.profiles:`
+        lines.append(f"{path}: {value}" if value else f"{path}.")
+    return "\n".join(lines)
+
+
+def parse_target_version(version):
+    """Parse a (major, minor) tuple from a version string like "Spring boot 3.2". Returns None if absent."""
+    match = re.search(r"(\d+)(?:\.(\d+))?", version)
+    if not match:
+        return None
+    return int(match[1]), int(match[2] or 0)
+
+
+def symbols_for_version(version):
+    """Return the symbols relevant to upgrading to the given target version."""
+    target = parse_target_version(version)
+    return sorted(symbol for symbol, since in DEPRECATED_SYMBOLS.items() if target is None or since <= target)
+
+
+class SymbolMatcher:
+    """Aho-Corasick automaton finding all of a set of symbols in a single pass over a text."""
+
+    def __init__(self, symbols):
+        self.symbols = sorted(symbols)
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [set()]
+        for symbol in self.symbols:
+            state = 0
+            for char in symbol:
+                if char not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.fail.append(0)
+                    self.outputs.append(set())
+                    self.transitions[state][char] = len(self.transitions) - 1
+                state = self.transitions[state][char]
+            self.outputs[state].add(symbol)
+
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.transitions[fail]:
+                    fail = self.fail[fail]
+                fail = self.transitions[fail].get(char, 0)
+                # Children of the root would otherwise fail over to themselves
+                self.fail[next_state] = 0 if fail == next_state else fail
+                self.outputs[next_state] |= self.outputs[self.fail[next_state]]
+
+    @property
+    def signature(self):
+        """A stable identifier for the symbol set, used to key cached scan results."""
+        return hashlib.sha256("\n".join(self.symbols).encode()).hexdigest()[:16]
+
+    def find(self, text):
+        """Return the set of symbols occurring in the text."""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.transitions[state]:
+                state = self.fail[state]
+            state = self.transitions[state].get(char, 0)
+            if self.outputs[state]:
+                found |= self.outputs[state]
+        return found
+
+
+class SymbolIndex:
+    """Index of the symbols referenced by each file, cached on disk by content hash."""
+
+    def __init__(self, matcher, cache_path=SYMBOL_INDEX_CACHE_PATH):
+        self.matcher = matcher
+        self.cache_path = cache_path
+        self.cache = {}
+        self.cache_hits = 0
+        if cache_path and os.path.isfile(cache_path):
+            try:
+                with open(cache_path, "r") as f:
+                    self.cache = json.load(f).get(matcher.signature, {})
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable symbol index cache %s: %s", cache_path, e)
+
+    def scan(self, source_code_map):
+        """Return a map of filename to the symbols it references, for files referencing any."""
+        matches = {}
+        for filename, source_code in source_code_map.items():
+            if not filename.endswith(SCANNED_EXTENSIONS):
+                continue
+            content_hash = hashlib.sha256(source_code.encode()).hexdigest()
+            if content_hash in self.cache:
+                self.cache_hits += 1
+                symbols = self.cache[content_hash]
+            else:
+                if filename.endswith(YAML_EXTENSIONS):
+                    source_code = f"{source_code}\n{flatten_yaml_keys(source_code)}"
+                symbols = sorted(self.matcher.find(source_code))
+                self.cache[content_hash] = symbols
+            if symbols:
+                matches[filename] = symbols
+        return matches
+
+    def save(self):
+        """Merge the scanned files into the cache file, replacing it atomically."""
+        if not self.cache_path:
+            return
+        with cache_lock:
+            caches = {}
+            if os.path.isfile(self.cache_path):
+                try:
+                    with open(self.cache_path, "r") as f:
+                        caches = json.load(f)
+                except (OSError, ValueError):
+                    pass
+            caches.setdefault(self.matcher.signature, {}).update(self.cache)
+            write_atomic(self.cache_path, json.dumps(caches).encode())
+
+
+def find_java_dependencies(source_code, path_index):
+    """Return the repo files imported by a Java source file."""
+    dependencies = set()
+    for imported in JAVA_IMPORT_PATTERN.findall(source_code):
+        parts = imported.split(".")
+        # Try the longest candidate first so nested and static imports resolve to their outer class file
+        for end in range(len(parts), 0, -1):
+            candidates = path_index.suffixes.get("/".join(parts[:end]) + ".java", [])
+            if candidates:
+                dependencies.update(candidates)
+                break
+    return dependencies
+
+
+def select_affected_files(source_code_map, version, path_index, cache_path=SYMBOL_INDEX_CACHE_PATH):
+    """Filter the source code map down to the files affected by an upgrade to the given version.
+
+    Keeps build files, files referencing a symbol deprecated or relocated by the target version, and the
+    repo files those import directly.
+    """
+    index = SymbolIndex(SymbolMatcher(symbols_for_version(version)), cache_path)
+    matches = index.scan(source_code_map)
+    index.save()
+
+    selected = {filename for filename in source_code_map if os.path.basename(filename) in BUILD_FILENAMES}
+    selected.update(matches)
+    for filename in matches:
+        if filename.endswith(".java"):
+            selected.update(find_java_dependencies(source_code_map[filename], path_index))
+
+    logger.info(
+        "Selected %s of %s file(s) for upgrade (%s referencing deprecated symbols, %s cached scan(s))",
+        len(selected), len(source_code_map), len(matches), index.cache_hits,
+    )
+    return {filename: source_code_map[filename] for filename in sorted(selected) if filename in source_code_map}
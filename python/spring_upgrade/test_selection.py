@@ -0,0 +1,94 @@
+import glob
+import os
+import re
+import shlex
+from typing import List
+
+from pydantic import BaseModel
+
+from maven import BUILD_FILENAMES, find_module_pom, is_within, maven_repo_options
+from utils import get_logger
+
+logger = get_logger()
+
+MAVEN_THREADS = os.environ.get("MAVEN_THREADS", "1C")
+TEST_SOURCE_DIR = os.path.join("src", "test", "java")
+
+
+class MavenTestSelection(BaseModel):
+    """Maven modules and test classes to run. An empty selection runs the full suite."""
+
+    modules: List[str] = []
+    tests: List[str] = []
+
+
+def class_name(filename):
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def find_test_files(root_dir):
+    """Return all Java test sources below the given directory."""
+    pattern = os.path.join(root_dir, "**", TEST_SOURCE_DIR, "**", "*.java")
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def select_tests(repo_dir, root_pom, changed_filenames):
+    """Map changed files to the Maven modules and test classes affected by them.
+
+    Changes to build files, or to files outside a module below `root_pom`, select the full suite. Changed
+    test classes are selected directly, and changed main classes select the test classes referencing them.
+    Any other change (e.g. resources) selects every test of its module.
+    """
+    root_dir = os.path.dirname(os.path.abspath(root_pom))
+    modules = set()
+    tests = set()
+    changed_classes = set()
+    module_wide = False
+
+    for filename in changed_filenames:
+        path = os.path.abspath(os.path.join(repo_dir, filename))
+        module_pom = find_module_pom(repo_dir, path)
+        if os.path.basename(path) in BUILD_FILENAMES or module_pom is None or not is_within(module_pom, root_dir):
+            logger.info("%s requires the full test suite", filename)
+            return MavenTestSelection()
+        modules.add(os.path.dirname(module_pom))
+        if not path.endswith(".java"):
+            module_wide = True
+        elif os.sep + TEST_SOURCE_DIR + os.sep in path:
+            tests.add(class_name(path))
+        else:
+            changed_classes.add(class_name(path))
+
+    if changed_classes:
+        reference_pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, sorted(changed_classes))) + r")\b")
+        for test_file in find_test_files(root_dir):
+            with open(test_file, "r", errors="ignore") as f:
+                if reference_pattern.search(f.read()):
+                    tests.add(class_name(test_file))
+                    modules.add(os.path.dirname(find_module_pom(repo_dir, test_file)))
+        if not tests:
+            module_wide = True
+
+    module_paths = sorted(os.path.relpath(module, root_dir) for module in modules)
+    if "." in module_paths:
+        module_paths = []
+    selection = MavenTestSelection(modules=module_paths, tests=[] if module_wide else sorted(tests))
+    logger.info("Selected modules %s and tests %s", selection.modules or "all", selection.tests or "all")
+    return selection
+
+
+def maven_test_command(code_dir, selection=None, threads=MAVEN_THREADS):
+    """Build the `mvn test` command line for a pom, scoped to the selection if given."""
+    command = ["mvn", "test", "-f", code_dir, *maven_repo_options()]
+    if selection is None:
+        return shlex.join(command)
+    command += ["-T", threads]
+    if selection.modules:
+        command += ["-pl", ",".join(selection.modules), "-am"]
+    if selection.tests:
+        command += [
+            f"-Dtest={','.join(selection.tests)}",
+            "-Dsurefire.failIfNoSpecifiedTests=false",
+            "-DfailIfNoTests=false",
+        ]
+    return shlex.join(command)
@@ -1,16 +1,11 @@
-import logging
 import boto3
 
+import structured_logging
+
 
 def get_logger():
-    """Configure a logger compatible with local python interpreter and Lambda."""
-    if len(logging.getLogger().handlers) > 0:
-        # The Lambda environment pre-configures a handler logging to stderr. If a handler is already configured,
-        # `.basicConfig` does not execute. Thus we set the level directly.
-        logging.getLogger().setLevel(logging.INFO)
-    else:
-        logging.basicConfig(level=logging.INFO)
-    return logging.getLogger()
+    """Return the logger shared by the spring upgrade modules."""
+    return structured_logging.get_logger("spring_upgrade")
 
 
 def get_config(parameter_store_prefix, parameter_names):
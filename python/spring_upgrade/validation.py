@@ -0,0 +1,167 @@
+import os
+import re
+from xml.etree import ElementTree
+
+from git_utils import update_source_code
+from maven import compile_modules, find_module_poms, find_reactor_pom
+from utils import get_logger
+
+logger = get_logger()
+
+MAX_REPAIR_ROUNDS = int(os.environ.get("MAX_REPAIR_ROUNDS", "2"))
+
+JAVA_TYPE_DECLARATION_PATTERN = re.compile(r"(?:\b(?:class|interface|enum|record)|@interface)\s+\w+")
+JAVA_FILES_WITHOUT_TYPES = {"package-info.java", "module-info.java"}
+CLOSING_BRACKETS = {")": "(", "]": "[", "}": "{"}
+
+
+def find_java_syntax_error(code):
+    """Run a lexical parse of Java source code.
+
+    Checks that comments, string, character and text block literals are terminated and that brackets
+    are balanced. Returns an error message, or None if the code passes.
+    """
+    brackets = []
+    line = 1
+    i = 0
+    length = len(code)
+    while i < length:
+        char = code[i]
+        if char == "\n":
+            line += 1
+        elif code.startswith("//", i):
+            end = code.find("\n", i)
+            i = length if end < 0 else end
+            continue
+        elif code.startswith("/*", i):
+            end = code.find("*/", i + 2)
+            if end < 0:
+                return f"Unterminated comment starting on line {line}"
+            line += code.count("\n", i, end)
+            i = end + 2
+            continue
+        elif code.startswith('"""', i):
+            end = code.find('"""', i + 3)
+            if end < 0:
+                return f"Unterminated text block starting on line {line}"
+            line += code.count("\n", i, end)
+            i = end + 3
+            continue
+        elif char in "\"'":
+            end = i + 1
+            while end < length and code[end] != char:
+                if code[end] == "\n":
+                    break
+                end += 2 if code[end] == "\\" else 1
+            if end >= length or code[end] != char:
+                return f"Unterminated literal on line {line}"
+            i = end + 1
+            continue
+        elif char in "([{":
+            brackets.append((char, line))
+        elif char in CLOSING_BRACKETS:
+            if not brackets or brackets[-1][0] != CLOSING_BRACKETS[char]:
+                return f"Unbalanced '{char}' on line {line}"
+            brackets.pop()
+        i += 1
+
+    if brackets:
+        char, opened_on = brackets[-1]
+        return f"Unclosed '{char}' opened on line {opened_on}"
+    return None
+
+
+def find_parse_errors(files):
+    """Run cheap parse checks over generated files.
+
+    Returns a map of filename to error message for every `UpdatedCode` which fails its check.
+    """
+    errors = {}
+    for file in files:
+        if not file.code.strip():
+            errors[file.filename] = "Generated file is empty"
+        elif file.filename.endswith(".xml"):
+            try:
+                ElementTree.fromstring(file.code)
+            except ElementTree.ParseError as e:
+                errors[file.filename] = f"Invalid XML: {e}"
+        elif file.filename.endswith(".java"):
+            error = find_java_syntax_error(file.code)
+            if error is None and os.path.basename(file.filename) not in JAVA_FILES_WITHOUT_TYPES:
+                if not JAVA_TYPE_DECLARATION_PATTERN.search(file.code):
+                    error = "No type declaration found"
+            if error:
+                errors[file.filename] = f"Invalid Java: {error}"
+    if errors:
+        logger.info("Parse check failed for %s file(s): %s", len(errors), list(errors))
+    return errors
+
+
+def find_compile_errors(repo_dir, filenames):
+    """Compile the Maven modules owning the given files offline, from the reactor each module belongs to.
+
+    Returns a map of repo-relative filename to compiler messages, and the reactor poms whose build was
+    inconclusive. Those are skipped, leaving them to the test stage.
+    """
+    reactors = {}
+    for pom in find_module_poms(repo_dir, filenames):
+        reactors.setdefault(find_reactor_pom(repo_dir, pom), []).append(pom)
+
+    errors = {}
+    skipped = []
+    for reactor_pom, module_poms in sorted(reactors.items()):
+        module_errors = compile_modules(reactor_pom, module_poms)
+        if module_errors is None:
+            logger.warning("Skipping compile check for %s", reactor_pom)
+            skipped.append(reactor_pom)
+            continue
+        for path, messages in module_errors.items():
+            errors[os.path.relpath(path, repo_dir)] = messages
+    return errors, skipped
+
+
+def compile_and_repair(provider, version, result, repo_dir, path_index, change_set, max_rounds=MAX_REPAIR_ROUNDS):
+    """Compile the modules affected by an upgrade and send compiler errors back to the model.
+
+    Only the failing repo files are sent for repair, for at most `max_rounds` rounds. Repaired files are written
+    to the repo and recorded in `change_set`. Returns the upgrade response including the repaired files.
+    """
+    changed_filenames = set(change_set.paths)
+    for round_number in range(max_rounds + 1):
+        errors, skipped = find_compile_errors(repo_dir, changed_filenames)
+        if not errors:
+            if skipped:
+                logger.warning("Compile check skipped for %s, the result is left to the test stage", skipped)
+            else:
+                logger.info("Compile check passed")
+            return result
+
+        # Generated sources, e.g. of annotation processors under target/, are not repo files and cannot be repaired
+        repairable = set(path_index.paths) | set(change_set.paths)
+        unrepairable = sorted(filename for filename in errors if filename not in repairable)
+        if unrepairable:
+            logger.warning("Not repairing compile errors in files outside the repo: %s", unrepairable)
+            errors = {filename: messages for filename, messages in errors.items() if filename in repairable}
+            if not errors:
+                return result
+        if round_number == max_rounds:
+            logger.warning("Compile errors remain in %s after %s repair round(s)", list(errors), max_rounds)
+            return result
+
+        logger.info("Repair round %s: %s file(s) failed to compile", round_number + 1, len(errors))
+        failing_source_code_map = {}
+        for filename in errors:
+            with open(os.path.join(repo_dir, filename), "r") as f:
+                failing_source_code_map[filename] = f.read()
+        repair = provider.repair_code(version, failing_source_code_map, errors, validator=find_parse_errors)
+        repair = path_index.resolve_response(repair)
+
+        parse_errors = find_parse_errors(repair.code)
+        repaired_files = [file for file in repair.code if file.filename not in parse_errors]
+        update_source_code(repaired_files, repo_dir, change_set=change_set)
+
+        repaired = {file.filename: file for file in result.code}
+        repaired.update({file.filename: file for file in repaired_files})
+        result = result.model_copy(update={"code": list(repaired.values())})
+        changed_filenames.update(file.filename for file in repaired_files)
+    return result
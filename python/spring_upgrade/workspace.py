@@ -0,0 +1,162 @@
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from utils import get_logger
+
+logger = get_logger()
+
+WORKSPACE_ROOT = os.environ.get("SPRING_UPGRADE_WORKSPACE", os.path.join(tempfile.gettempdir(), "spring_upgrade"))
+WORKSPACE_QUOTA_BYTES = int(os.environ.get("WORKSPACE_QUOTA_MB", "400")) * 1024 * 1024
+# How long a request waits for running requests to release space before failing
+WORKSPACE_WAIT_SECONDS = float(os.environ.get("WORKSPACE_WAIT_SECONDS", "600"))
+
+
+class WorkspaceQuotaExceeded(Exception):
+    pass
+
+
+def disk_usage(path):
+    """Return the total size in bytes of the files below a path."""
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(directory, filename)).st_size
+            except OSError:
+                continue
+    return total
+
+
+class Workspace:
+    """A per-request directory, removed when the request finishes."""
+
+    def __init__(self, path, manager):
+        self.path = path
+        self.manager = manager
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage and record the disk and memory usage after it.
+
+        Only the request directory is measured, the shared caches are measured when space is needed. The peak of
+        Python allocations during the stage is only recorded while `tracemalloc` is tracing.
+        """
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            memory = {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+            if tracemalloc.is_tracing():
+                memory["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+            workspace_bytes = disk_usage(self.path)
+            self.stages.append(
+                {"stage": name, "duration": round(duration, 3), "workspace_bytes": workspace_bytes, **memory}
+            )
+            if self.manager.history is not None:
+                self.manager.history.append("stage", stage=name, duration=round(duration, 3), **memory)
+            logger.info("Stage %s took %.2fs, workspace=%sB", name, duration, workspace_bytes)
+
+
+class WorkspaceManager:
+    """Hand out per-request directories under a byte quota on the ephemeral /tmp of warm Lambda containers.
+
+    Request directories are removed when the request finishes, whether it succeeded or failed. Cache
+    directories (git mirrors, the Maven repository) are kept between requests and evicted, least recently
+    used first, when the quota is exceeded. While other requests are running, a new request waits up to
+    `wait_seconds` for them to finish instead.
+    """
+
+    def __init__(
+        self, root=WORKSPACE_ROOT, quota_bytes=WORKSPACE_QUOTA_BYTES, history=None, wait_seconds=WORKSPACE_WAIT_SECONDS
+    ):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.history = history
+        self.wait_seconds = wait_seconds
+        self.requests_root = os.path.join(root, "requests")
+        self.cache_root = os.path.join(root, "cache")
+        self.active = set()
+        self.released = threading.Condition()
+        os.makedirs(self.requests_root, exist_ok=True)
+        os.makedirs(self.cache_root, exist_ok=True)
+
+    def cache_dir(self, name):
+        """Return a cache directory kept between requests, marking it as recently used."""
+        path = os.path.join(self.cache_root, name)
+        os.makedirs(path, exist_ok=True)
+        os.utime(path)
+        return path
+
+    def _remove_stale_workspaces(self):
+        """Remove request directories left behind by requests that did not finish, e.g. on timeout."""
+        for name in os.listdir(self.requests_root):
+            path = os.path.join(self.requests_root, name)
+            if path not in self.active:
+                logger.info("Removing stale workspace %s", path)
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _free_capacity(self):
+        """Free space until the workspace root is under quota. Returns False if that needs running requests to end.
+
+        Caches are only evicted while no other request is running, as running requests may be using them.
+        """
+        self._remove_stale_workspaces()
+        usage = disk_usage(self.root)
+        if usage <= self.quota_bytes:
+            return True
+        if self.active:
+            return False
+
+        caches = sorted(
+            (os.path.join(self.cache_root, name) for name in os.listdir(self.cache_root)), key=os.path.getmtime
+        )
+        for cache in caches:
+            logger.info("Evicting cache %s to stay under quota", cache)
+            shutil.rmtree(cache, ignore_errors=True)
+            usage = disk_usage(self.root)
+            if usage <= self.quota_bytes:
+                return True
+        raise WorkspaceQuotaExceeded(f"Workspace usage {usage}B exceeds quota {self.quota_bytes}B")
+
+    def ensure_capacity(self):
+        """Free space until the workspace root is under quota, waiting for running requests to release theirs.
+
+        Must be called holding `released`.
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        while not self._free_capacity():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WorkspaceQuotaExceeded(
+                    f"Workspace over quota {self.quota_bytes}B after waiting {self.wait_seconds}s for running requests"
+                )
+            logger.info("Workspace over quota, waiting for %s running request(s) to finish", len(self.active))
+            self.released.wait(remaining)
+
+    @contextmanager
+    def workspace(self, request_id):
+        """Create a directory for a request and remove it when the request finishes."""
+        path = os.path.join(self.requests_root, request_id)
+        with self.released:
+            self.ensure_capacity()
+            self.active.add(path)
+        os.makedirs(path, exist_ok=True)
+        workspace = Workspace(path, self)
+        try:
+            yield workspace
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            with self.released:
+                self.active.discard(path)
+                self.released.notify_all()
+            logger.info("Removed workspace %s, stages: %s", path, workspace.stages)